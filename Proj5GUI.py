@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 import math
+import os
 import random
 import signal
 import sys
@@ -27,6 +28,7 @@ else:
 from TSPSolver import *
 #from TSPSolver_complete import *
 from TSPClasses import *
+from result_cache import ResultCache
 
 
 class PointLineView( QWidget ):
@@ -41,12 +43,14 @@ class PointLineView( QWidget ):
 		self.data_range = data_range
 		self.start_pt = None
 		self.end_pt = None
+		self._scene_cache = None
 
 	def displayStatusText(self, text):
 		self.status_bar.showMessage(text)
 
 	def clearPoints(self):
 		self.pointList = {}
+		self._invalidate()
 
 	def clearEdges(self,removeColors = None):
 		self.edgeList = {}
@@ -56,9 +60,11 @@ class PointLineView( QWidget ):
 					del self.labelList[color]			
 		else:
 			self.labelList = {}
-		self.repaint()
+		self._invalidate()
+		self.update()
 
 	def addPoints( self, point_list, color ):
+		self._invalidate()
 		if color in self.pointList:
 			self.pointList[color].extend( point_list )
 		else:
@@ -82,6 +88,7 @@ class PointLineView( QWidget ):
 		assert( type(label)	  == str )
 
 		edge = QLineF(startPt, endPt)
+		self._invalidate()
 		if edgeColor in self.edgeList.keys():
 			self.edgeList[edgeColor].append( edge )
 		else:
@@ -92,6 +99,7 @@ class PointLineView( QWidget ):
 		self.addLabel( midp, label, labelColor, xoffset=xoffset )
 
 	def addLabel( self, point, label, labelColor,xoffset=0.0 ):
+		self._invalidate()
 		if labelColor in self.labelList.keys():
 			self.labelList[labelColor].append( (point,label,xoffset) )
 		else:
@@ -100,8 +108,31 @@ class PointLineView( QWidget ):
 
 
 
+	# Level of detail: when items are packed closer than this many pixels
+	# apart, arrowheads and edge labels are not drawn
+	ARROW_MIN_SPACING = 12.0
+	LABEL_MIN_SPACING = 30.0
+
+	def _invalidate(self):
+		self._scene_cache = None
+
+	def resizeEvent(self, event):
+		self._invalidate()
+		super(PointLineView,self).resizeEvent(event)
+
 	def paintEvent(self, event):
+		# The scene only changes when points/edges/labels are modified or the
+		# widget is resized, so it is rendered once into a pixmap and reused
+		if self._scene_cache is None or self._scene_cache.size() != self.size():
+			self._scene_cache = QPixmap(self.size())
+			self._scene_cache.fill(Qt.transparent)
+			painter = QPainter(self._scene_cache)
+			self.renderScene(painter)
+			painter.end()
 		painter = QPainter(self)
+		painter.drawPixmap(0, 0, self._scene_cache)
+
+	def renderScene(self, painter):
 		painter.setRenderHint(QPainter.Antialiasing,True)
 
 		xr = self.data_range['x']
@@ -119,76 +150,72 @@ class PointLineView( QWidget ):
 		tform.scale(1.0,-1.0)
 		painter.setTransform(tform)
 
-		for color in self.edgeList:
-			c = QColor(color[0],color[1],color[2])
-			painter.setPen( c )
-			for edge in self.edgeList[color]:
-				ln = QLineF( scale*edge.x1(), scale*edge.y1(), scale*edge.x2(), scale*edge.y2() )
-				painter.drawLine( ln )
+		nedges = sum( len(edges) for edges in self.edgeList.values() )
+		nlabels = sum( len(labels) for labels in self.labelList.values() )
+		spacing = math.sqrt( w*h / max(nedges+nlabels, 1) )
+		show_arrows = spacing >= self.ARROW_MIN_SPACING
+		show_labels = spacing >= self.LABEL_MIN_SPACING
 
+		# All edges of one color go out in a single drawLines call
 		for color in self.edgeList:
 			c = QColor(color[0],color[1],color[2])
 			painter.setPen( c )
+			painter.drawLines( [QLineF( scale*edge.x1(), scale*edge.y1(), scale*edge.x2(), scale*edge.y2() )
+								for edge in self.edgeList[color]] )
+
+		# Arrowheads are built directly in scene coordinates and filled as
+		# one path per color
+		#arrow_scale = .015
+		arrow_scale = 5.0
+		for color in self.edgeList if show_arrows else []:
+			c = QColor(color[0],color[1],color[2])
+			arrows = QPainterPath()
+			arrows.setFillRule(Qt.WindingFill)
 			for edge in self.edgeList[color]:
-				#arrow_scale = .015
-				arrow_scale = 5.0
-				unit_edge = ( edge.x2() - edge.x1(), edge.y2() - edge.y1() )
 				unit_edge_mag = math.sqrt( ( edge.x2() - edge.x1())**2 + ( edge.y2() - edge.y1() )**2 )
-				unit_edge = (unit_edge[0] / unit_edge_mag, unit_edge[1] / unit_edge_mag )
-				unit_edge_perp = (-unit_edge[1], unit_edge[0])
-
-				temp_tform = QTransform()
-				temp_tform.translate(self.width()/2.0,self.height()/2.0)
-				temp_tform.scale(1.0,-1.0)
-				temp_tform.translate(scale*edge.x2(),scale*edge.y2())
-				temp_tform.scale(1.0,-1.0)
-				painter.setTransform(temp_tform)
-				#painter.drawText( RECT, label[1], align )
-
-				tri_pts = []
-				tri_pts.append( QPointF(0,0) )
-				tri_pts.append( QPointF(-arrow_scale*(2*unit_edge[0] + unit_edge_perp[0]),
-										arrow_scale*(2*unit_edge[1] + unit_edge_perp[1])) )
-				tri_pts.append( QPointF(-arrow_scale*(2*unit_edge[0] - unit_edge_perp[0]),
-										arrow_scale*(2*unit_edge[1] - unit_edge_perp[1])) )
-				tri = QPolygonF( tri_pts )
-				b = painter.brush()
-				painter.setBrush( c )
-				painter.drawPolygon( tri )
-				painter.setBrush( b )
-
-		painter.setTransform(tform)
+				if unit_edge_mag == 0.0:
+					continue
+				ux = ( edge.x2() - edge.x1() ) / unit_edge_mag
+				uy = ( edge.y2() - edge.y1() ) / unit_edge_mag
+				tip_x = scale*edge.x2()
+				tip_y = scale*edge.y2()
+				arrows.addPolygon( QPolygonF( [QPointF(tip_x, tip_y),
+					QPointF(tip_x - arrow_scale*(2*ux - uy), tip_y - arrow_scale*(2*uy + ux)),
+					QPointF(tip_x - arrow_scale*(2*ux + uy), tip_y - arrow_scale*(2*uy - ux)),
+					QPointF(tip_x, tip_y)] ) )
+			painter.setPen( c )
+			painter.fillPath( arrows, c )
+			painter.drawPath( arrows )
+
+		# Text is drawn with an unflipped transform, so each label only needs
+		# its rectangle offset rather than its own QTransform
+		text_tform = QTransform()
+		text_tform.translate(self.width()/2.0,self.height()/2.0)
+		painter.setTransform(text_tform)
 		font = QFont("Monospace")
 		font.setStyleHint(QFont.TypeWriter)
 
 		R = 1.0E3
 		CITY_SIZE = 2.0 # DIAMETER
-		RECT = QRectF(-R,-R,2.0*R,2.0*R)
 		align = QTextOption( Qt.Alignment(Qt.AlignHCenter | Qt.AlignVCenter) )
-		for color in self.labelList:
+		for color in self.labelList if show_labels else []:
 			c = QColor(color[0],color[1],color[2])
 			painter.setPen( c )
 			for label in self.labelList[color]:
-				temp_tform = QTransform()
-				temp_tform.translate(self.width()/2.0,self.height()/2.0)
-				temp_tform.scale(1.0,-1.0)
 				pt = label[0]
 				xoff = label[2]
-				temp_tform.translate(scale*pt.x()+xoff,scale*pt.y())
-				temp_tform.scale(1.0,-1.0)
-				painter.setTransform(temp_tform)
-				painter.drawText( RECT, label[1], align )
+				painter.drawText( QRectF(scale*pt.x()+xoff-R, -scale*pt.y()-R, 2.0*R, 2.0*R), label[1], align )
 
+		# Cities are drawn as one batch of round, wide-pen points
 		painter.setTransform(tform)
 		for color in self.pointList:
 			c = QColor(color[0],color[1],color[2])
-			painter.setPen( c )
-			b = painter.brush()
-			painter.setBrush(c)
-			for point in self.pointList[color]:
-				pt = QPointF(scale*point.x(), scale*point.y())
-				painter.drawEllipse( pt, CITY_SIZE, CITY_SIZE)
-			painter.setBrush(b)
+			pen = QPen( c )
+			pen.setWidthF( 2.0*CITY_SIZE )
+			pen.setCapStyle( Qt.RoundCap )
+			painter.setPen( pen )
+			painter.drawPoints( QPolygonF( [QPointF(scale*point.x(), scale*point.y())
+											for point in self.pointList[color]] ) )
 
 
 
@@ -372,6 +399,16 @@ class Proj5GUI( QMainWindow ):
 		('Branch and Bound','branchAndBound'), \
 		('2-swap','two_swap_local_search'), \
 		('Local Search Tournament','local_search_tournament'), \
+		('Or-opt','or_opt_local_search'), \
+		('Ant Colony','ant_colony'), \
+		('Greedy Edge','greedy_edge'), \
+		('Space-filling Curve','space_filling_curve'), \
+		('Hybrid Branch and Bound','hybrid_branch_and_bound'), \
+		('Cluster Decomposition','cluster_decomposition'), \
+		('Portfolio','portfolio'), \
+		('Tabu Search','tabu_search'), \
+		('Simulated Annealing','simulated_annealing'), \
+		('Symmetric Transform','symmetric_transform'), \
 	]															# whitespace hack to get longest to display correctly
 
 	def initUI( self ):
@@ -532,6 +569,8 @@ if __name__ == '__main__':
 	time_limit_seconds = 600
 	gui = Proj5GUI()
 	s = gui.solver	
+	# Set TSP_RESULT_CACHE to a directory to reuse results of unchanged algorithms
+	cache = ResultCache(os.environ.get('TSP_RESULT_CACHE'))
 
 	algorithms_to_test = [s.defaultRandomTour, s.greedy, s.branchAndBound, s.two_swap_local_search, s.local_search_tournament]
 	names = ["Random", "Greedy", "BandB", "2Swap", "LSTA"]
@@ -552,7 +591,7 @@ if __name__ == '__main__':
 				gui.curSeed.setText(f"{seed}")
 				gui.generateNetwork()
 				s.setupWithScenario(gui._scenario)
-				results = alg(time_limit_seconds)
+				results = cache.run(s, alg, time_limit_seconds)
 				elapsed_time += float(results['time'])/5
 				cost += float(results['cost'])/5
 			
@@ -54,6 +54,103 @@ def nameForInt( num ):
 
 
 
+class EdgeSet:
+	''' <summary>
+		Which directed edges exist between n cities, stored one bit per edge
+		(rows packed 8 columns to a byte, as np.packbits does). Indexing with
+		[src,dst] works like a boolean n x n array for scalar and (broadcast)
+		array indices.
+		</summary> '''
+
+	def __init__( self, ncities, packed=None ):
+		self._n = ncities
+		self._stride = (ncities + 7) // 8
+		if packed is None:
+			# All edges except self-edges, built directly in packed form
+			self._buf = bytearray( b'\xff' ) * (ncities * self._stride)
+		else:
+			self._buf = bytearray( packed )
+		self._bits = np.frombuffer( self._buf, dtype=np.uint8 ).reshape( (ncities, self._stride) )
+		if packed is None and ncities > 0:
+			if ncities % 8:
+				self._bits[:,-1] &= np.uint8( (0xff << (8 - ncities % 8)) & 0xff )
+			ind = np.arange( ncities )
+			self._bits[ind, ind >> 3] &= ~(np.uint8(0x80) >> (ind & 7).astype(np.uint8))
+
+	def _scalar_index( self, src, dst ):
+		''' Wrap negative scalar indices as an array would, and reject ones
+			out of range, which would otherwise read some other bit. '''
+		n = self._n
+		if not (-n <= src < n and -n <= dst < n):
+			raise IndexError( 'edge ({}, {}) out of range for {} cities'.format( src, dst, n ) )
+		return src % n, dst % n
+
+	def __getitem__( self, key ):
+		src, dst = key
+		if type(src) is int and type(dst) is int:
+			if src < 0 or dst < 0 or src >= self._n or dst >= self._n:
+				src, dst = self._scalar_index( src, dst )
+			return (self._buf[src * self._stride + (dst >> 3)] >> (7 - (dst & 7))) & 1 == 1
+		src = np.asarray( src )
+		dst = np.asarray( dst )
+		# Rows index the bit array directly, but a negative column would
+		# pick the wrong byte and bit
+		dst = np.where( dst < 0, dst + self._n, dst )
+		return ( (self._bits[src, dst >> 3] >> (7 - (dst & 7))) & 1 ).astype( bool )
+
+	def __setitem__( self, key, exists ):
+		src = int(key[0])
+		dst = int(key[1])
+		if src < 0 or dst < 0 or src >= self._n or dst >= self._n:
+			src, dst = self._scalar_index( src, dst )
+		at = src * self._stride + (dst >> 3)
+		bit = 0x80 >> (dst & 7)
+		if exists:
+			self._buf[at] |= bit
+		else:
+			self._buf[at] &= ~bit & 0xff
+
+	def copy( self ):
+		return EdgeSet( self._n, self._buf )
+
+	@staticmethod
+	def wrap( ncities, buffer ):
+		''' An EdgeSet over an existing packed buffer (e.g. a shared memory
+			block) without copying it. Read-only buffers give a read-only set. '''
+		edges = EdgeSet.__new__( EdgeSet )
+		edges._n = ncities
+		edges._stride = (ncities + 7) // 8
+		edges._buf = memoryview( buffer )
+		edges._bits = np.frombuffer( edges._buf, dtype=np.uint8 ).reshape( (ncities, edges._stride) )
+		return edges
+
+	def __reduce__( self ):
+		# Pickle the packed bytes only; _bits is a view that must be rebuilt
+		return ( EdgeSet, (self._n, bytes(self._buf)) )
+
+	def subset( self, indices ):
+		''' The edges among the given cities, renumbered 0..len(indices)-1. '''
+		indices = np.asarray( indices )
+		mask = self[indices[:,np.newaxis], indices[np.newaxis,:]]
+		return EdgeSet( len(indices), np.packbits( mask, axis=1 ).tobytes() )
+
+	def row( self, src ):
+		''' Boolean vector of the edges leaving city src. '''
+		return np.unpackbits( self._bits[src] )[:self._n].astype( bool )
+
+	def col( self, dst ):
+		''' Boolean vector of the edges entering city dst. '''
+		return ( (self._bits[:, dst >> 3] >> (7 - (dst & 7))) & 1 ).astype( bool )
+
+	def toarray( self ):
+		return np.unpackbits( self._bits, axis=1 )[:, :self._n].astype( bool )
+
+	def count( self ):
+		''' Number of edges that exist. '''
+		return int( np.unpackbits( self._bits ).sum() )
+
+
+
 class Scenario:
 
 	HARD_MODE_FRACTION_TO_REMOVE = 0.20 # Remove 20% of the edges
@@ -74,6 +171,9 @@ class Scenario:
 			self._cities = [City( pt.x(), pt.y() ) for pt in city_locations]
 
 		self.index_of_city = {city:i for i, city in enumerate(self._cities)}
+		self._coords = ( np.array( [c._x for c in self._cities] ),
+						 np.array( [c._y for c in self._cities] ),
+						 np.array( [c._elevation for c in self._cities] ) )
 		num = 0
 		for city in self._cities:
 			#if difficulty == "Hard":
@@ -83,7 +183,10 @@ class Scenario:
 
 		# Assume all edges exists except self-edges
 		ncities = len(self._cities)
-		self._edge_exists = ( np.ones((ncities,ncities)) - np.diag( np.ones((ncities)) ) ) > 0
+		self._edge_exists = EdgeSet( ncities )
+		# Cleared once some edge exists one way only (see isSymmetric)
+		self._edges_symmetric = True
+		self._cost_matrix = None
 
 		if difficulty == "Hard":
 			self.thinEdges()
@@ -93,6 +196,139 @@ class Scenario:
 	def getCities( self ):
 		return self._cities
 
+	def addCity( self, x, y, elevation=None ):
+		''' <summary>
+			Add a city at (x, y), with edges to and from every other city.
+			The elevation is random unless given (and always 0 in Easy mode).
+			Coordinates, edges and the cached cost matrix are extended in
+			place with only the new row and column computed: O(n) costs,
+			plus copying the existing arrays. Returns the new City.
+			</summary> '''
+		n = len(self._cities)
+		if self._difficulty == 'Easy':
+			elevation = 0.0
+		elif elevation is None:
+			elevation = random.uniform(0.0,1.0)
+		city = City( x, y, elevation )
+		city.setScenario( self )
+		city.setIndexAndName( n, nameForInt( n+1 ) )
+		self._cities.append( city )
+		self.index_of_city[city] = n
+		self._coords = tuple( np.append( array, value ) for array, value in zip( self._coords, (x, y, elevation) ) )
+
+		old = self._edge_exists
+		edges = EdgeSet( n+1 )
+		edges._bits[:n, :old._stride] = old._bits
+		edges._bits[:n, n >> 3] |= np.uint8( 0x80 >> (n & 7) )
+		self._edge_exists = edges
+
+		if self._cost_matrix is not None:
+			cost = np.empty( (n+1, n+1) )
+			cost[:n, :n] = self._cost_matrix
+			ind = np.arange( n+1 )
+			cost[n, :] = self.costsBetween( np.full( n+1, n ), ind )
+			cost[:, n] = self.costsBetween( ind, np.full( n+1, n ) )
+			self._cost_matrix = cost
+		return city
+
+	def removeCity( self, city ):
+		''' <summary>
+			Remove a city and its edges. Later cities move down one index
+			(keeping their names); the removed City is detached from the
+			scenario. The cached cost matrix loses one row and column
+			without recomputing any costs.
+			</summary> '''
+		i = city._index
+		keep = np.delete( np.arange( len(self._cities) ), i )
+		self._edge_exists = self._edge_exists.subset( keep )
+		self._coords = tuple( np.delete( array, i ) for array in self._coords )
+		if self._cost_matrix is not None:
+			self._cost_matrix = self._cost_matrix[np.ix_( keep, keep )]
+		del self._cities[i]
+		del self.index_of_city[city]
+		for j in range( i, len(self._cities) ):
+			self._cities[j].setIndexAndName( j, self._cities[j]._name )
+			self.index_of_city[self._cities[j]] = j
+		city.setScenario( None )
+		city.setIndexAndName( -1, city._name )
+
+	def setEdge( self, src, dst, exists ):
+		''' Add or delete the edge from city index src to dst, updating the
+			cached cost matrix entry. O(1) '''
+		if src == dst:
+			return
+		self._edge_exists[src,dst] = exists
+		if self._edge_exists[dst,src] != bool(exists):
+			self._edges_symmetric = False
+		if self._cost_matrix is not None:
+			self._cost_matrix[src,dst] = self.costsBetween( np.array( [src] ), np.array( [dst] ) )[0]
+
+	def deleteEdges( self, mask ):
+		''' Delete every edge where the boolean n x n mask is True, updating
+			the cached cost matrix. O(n^2) '''
+		keep = self._edge_exists.toarray() & ~mask
+		self._edge_exists = EdgeSet( len(self._cities), np.packbits( keep, axis=1 ).tobytes() )
+		if not np.array_equal( keep, keep.T ):
+			self._edges_symmetric = False
+		if self._cost_matrix is not None:
+			# A matrix attached from shared memory is read-only
+			if not self._cost_matrix.flags.writeable:
+				self._cost_matrix = self._cost_matrix.copy()
+			self._cost_matrix[mask] = np.inf
+
+	def subScenario( self, indices ):
+		''' <summary>
+			A new Scenario containing copies of the cities with the given
+			indices (renumbered in that order), with the same difficulty,
+			elevations and edges between them.
+			</summary> '''
+		sub = Scenario.__new__( Scenario )
+		sub._difficulty = self._difficulty
+		sub._cities = []
+		for num, i in enumerate( indices ):
+			city = self._cities[i]
+			copy = City( city._x, city._y, city._elevation )
+			copy.setScenario( sub )
+			copy.setIndexAndName( num, city._name )
+			sub._cities.append( copy )
+		sub.index_of_city = {city:i for i, city in enumerate(sub._cities)}
+		sub._coords = tuple( array[np.asarray(indices, dtype=int)] for array in self._coords )
+		sub._edge_exists = self._edge_exists.subset( indices )
+		sub._edges_symmetric = self._edges_symmetric
+		sub._cost_matrix = None
+		return sub
+
+	def isSymmetric( self ):
+		''' Whether costTo(a, b) == costTo(b, a) for every pair: Easy mode,
+			as long as no edge has been deleted in one direction only (by
+			setEdge or deleteEdges). Conservative: restoring the other
+			direction later does not set it again. '''
+		return self._difficulty == 'Easy' and self._edges_symmetric
+
+	def getCostMatrix( self ):
+		''' <summary>
+			Dense matrix of City.costTo values (np.inf where there is no
+			edge), computed with numpy in one pass and cached.
+			</summary> '''
+		if self._cost_matrix is None:
+			ind = np.arange( len(self._cities) )
+			self._cost_matrix = self.costsBetween( ind[:,np.newaxis], ind[np.newaxis,:] )
+		return self._cost_matrix
+
+	def costsBetween( self, src, dst ):
+		''' <summary>
+			Vectorised City.costTo: the cost from each city index in src to
+			the matching (broadcast) city index in dst.
+			</summary> '''
+		xs, ys, el = self._coords
+		cost = np.sqrt( (xs[dst] - xs[src])**2 + (ys[dst] - ys[src])**2 )
+		if not self._difficulty == 'Easy':
+			cost += el[dst] - el[src]
+			np.maximum( cost, 0.0, out=cost )
+		cost = np.ceil( cost * City.MAP_SCALE )
+		cost[~self._edge_exists[src,dst]] = np.inf
+		return cost
+
 
 	def randperm( self, n ):				#isn't there a numpy function that does this and even gets called in Solver?
 		perm = np.arange(n)
@@ -108,7 +344,10 @@ class Scenario:
 		edge_count = ncities*(ncities-1) # can't have self-edge
 		num_to_remove = np.floor(self.HARD_MODE_FRACTION_TO_REMOVE*edge_count)
 
-		can_delete	= self._edge_exists.copy()
+		# Plain boolean arrays while thinning: indexing them with the numpy
+		# ints drawn below is cheap, and the result is packed once at the end
+		exists		= self._edge_exists.toarray()
+		can_delete	= exists.copy()
 
 		# Set aside a route to ensure at least one tour exists
 		route_keep = np.random.permutation( ncities )
@@ -125,9 +364,12 @@ class Scenario:
 			else:
 				src = np.random.randint(ncities)
 				dst = np.random.randint(ncities)
-			if self._edge_exists[src,dst] and can_delete[src,dst]:
-				self._edge_exists[src,dst] = False
+			if exists[src,dst] and can_delete[src,dst]:
+				exists[src,dst] = False
 				num_to_remove -= 1
+		self._edge_exists = EdgeSet( ncities, np.packbits( exists, axis=1 ).tobytes() )
+		self._edges_symmetric = False
+		self._cost_matrix = None
 
 
 
@@ -161,7 +403,15 @@ class City:
 
 		# In hard mode, remove edges; this slows down the calculation...
 		# Use this in all difficulties, it ensures INF for self-edge
-		if not self._scenario._edge_exists[self._index, other_city._index]:
+		# (the bit lookup is EdgeSet.__getitem__ inlined, as this is hot)
+		edges = self._scenario._edge_exists
+		src = self._index
+		dst = other_city._index
+		if src < 0 or dst < 0:
+			# e.g. a city removed from its scenario; EdgeSet wraps or rejects
+			if not edges[src, dst]:
+				return np.inf
+		elif not (edges._buf[src * edges._stride + (dst >> 3)] >> (7 - (dst & 7))) & 1:
 			return np.inf
 
 		# Euclidean Distance
@@ -13,7 +13,19 @@ from TSPClasses import *
 from Proj5GUI import Proj5GUI
 import random
 import heapq
-from state import State
+from state import State, DominanceTable, search_key
+from local_search import MATRIX_TWO_OPT_MAX, neighbor_lists, or_opt, tabu_search, two_opt, two_opt_matrix
+from ant_colony import AntColony
+from construction import cheapest_insertion, complete_tour, greedy_edge_tour, hilbert_tour, repair_tour
+from spatial import ScenarioCosts, nearest_index, sparse_neighbor_lists
+from checkpoint import load_checkpoint, save_checkpoint
+from decomposition import decompose_and_solve
+from portfolio import race
+from annealing import anneal
+from elimination import eliminate_edges, pruned_costs
+from doubling import double_costs, double_tour, undouble_tour
+import itertools
+import os
 
 
 def swap_elements(el1, el2):
@@ -26,10 +38,17 @@ def swap_elements(el1, el2):
 class TSPSolver:
     def __init__(self, gui_view):
         self._scenario = None
+        # Set to an anytime.AnytimeProfile to record each run's improvements
+        self.profile = None
 
     def setupWithScenario(self, scenario):
         self._scenario = scenario
 
+    def _improved(self, cost, **counters):
+        """Report a new best tour cost to the anytime profile, if any."""
+        if self.profile is not None:
+            self.profile.record(cost, counters)
+
     def defaultRandomTour(self, time_allowance=60.0):
         results = {}
         cities = self._scenario.getCities()
@@ -50,6 +69,7 @@ class TSPSolver:
             if bssf.cost < np.inf:
                 # Found a valid route
                 foundTour = True
+                self._improved(bssf.cost, count=count)
         end_time = time.time()
         results['cost'] = bssf.cost if foundTour else math.inf
         results['time'] = end_time - start_time
@@ -60,34 +80,118 @@ class TSPSolver:
         results['pruned'] = None
         return results
     
-    def branchAndBound(self, time_allowance=60.0):
+    def branchAndBound(self, time_allowance=60.0, dominance_entries=DominanceTable.MAX_ENTRIES,
+                       strategy='hybrid', weight=2.0, checkpoint=None, checkpoint_interval=60.0,
+                       incumbent=None, polish_interval=None, n_polish=3, eliminate=False):
+        """Branch and bound search. If checkpoint names a file, progress is
+        saved there every checkpoint_interval seconds and when the search
+        stops. If that file already exists, the search resumes from it
+        (with its strategy and weight) and runs for up to time_allowance
+        more seconds; the reported time then covers all runs.
+
+        An incumbent TSPSolution seeds the BSSF so pruning starts at once.
+        With a polish_interval, every that many seconds the n_polish most
+        promising queued paths are completed greedily and improved with
+        2-opt and Or-opt, and any better tour becomes the new BSSF.
+
+        With eliminate, edges that cannot be in a tour better than the
+        incumbent (see elimination.eliminate_edges) are first deleted from
+        the scenario for good; results['eliminated'] counts them."""
         results = {}
         n_sols = 0
         pruned = 0
         max_q_size = 0
         State.nstates = 0
+        State.clear_pool()
         start = time.perf_counter()
+        eliminated = 0
+        if eliminate and incumbent is not None:
+            eliminated = eliminate_edges(self._scenario, incumbent.cost)
         cities = self._scenario._cities
         BSSF = State()
+        dominance = DominanceTable(dominance_entries)
+        # Queue entries are (key, key, tiebreak, state) tuples, so the heap
+        # never has to call back into State to compare entries
+        tiebreak = itertools.count()
         q = []
-
-        heapq.heappush(q, State(cities[0]))
+        previous = 0.0
+        if checkpoint is not None and os.path.exists(checkpoint):
+            saved = load_checkpoint(checkpoint, self._scenario)
+            strategy = saved['params']['strategy']
+            weight = saved['params']['weight']
+            key = search_key(strategy, weight)
+            counters = saved['counters']
+            previous = counters['time']
+            n_sols = counters['count']
+            pruned = counters['pruned']
+            max_q_size = counters['max']
+            dominance.best = saved['dominance']
+            dominance.pruned = saved['dominance_pruned']
+            if saved['bssf_path'] is not None:
+                BSSF = State.from_route([cities[i] for i in saved['bssf_path']], saved['bssf_bound'])
+            for state in State.from_paths(cities, saved['queue_paths']):
+                q.append(key(state) + (next(tiebreak), state))
+            heapq.heapify(q)
+            # Replaying the queue rebuilt states that were already counted
+            State.nstates = counters['total']
+        else:
+            key = search_key(strategy, weight)
+            root = State(cities[0])
+            heapq.heappush(q, key(root) + (next(tiebreak), root))
+
+        if incumbent is not None and incumbent.cost < BSSF.get_lowerbound():
+            BSSF = State.from_route(incumbent.route, incumbent.cost)
+        self._improved(BSSF.get_lowerbound(), count=n_sols, total=State.nstates, pruned=pruned)
+        polished = 0
+        if polish_interval is not None:
+            cost_mat = self._scenario.getCostMatrix()
+            neighbors = neighbor_lists(cost_mat)
+
+        def save():
+            counters = {'time': previous + time.perf_counter() - start, 'count': n_sols, 'pruned': pruned,
+                        'max': max_q_size, 'total': State.nstates}
+            save_checkpoint(checkpoint, self._scenario, BSSF, [entry[-2:] for entry in q], dominance,
+                            counters, {'strategy': strategy, 'weight': weight})
+
+        last_save = last_polish = time.perf_counter()
         while len(q) > 0 and time.perf_counter()-start < time_allowance:
-            current = heapq.heappop(q)
-            if current.get_lowerbound() < BSSF.get_lowerbound():
+            current = heapq.heappop(q)[-1]
+            if dominance.is_dominated(current):
+                pass
+            elif current.get_lowerbound() < BSSF.get_lowerbound():
                 if current.is_solution():
                     BSSF = current
                     n_sols+=1
-                for child in current.expand():
+                    self._improved(BSSF.get_lowerbound(), count=n_sols, total=State.nstates, pruned=pruned)
+                for child in current.expand(dominance):
                     if child.get_lowerbound() < BSSF.get_lowerbound():
-                        heapq.heappush(q, child)
+                        heapq.heappush(q, key(child) + (next(tiebreak), child))
                     else:
+                        child.release()
                         pruned+=1
                 if len(q) > max_q_size:
                     max_q_size = len(q)
             else:
                 pruned+=1
+            # The children have been built, so the matrix can be reused
+            current.release()
+            if polish_interval is not None and time.perf_counter() - last_polish >= polish_interval:
+                deadline = time.perf_counter() + polish_interval / 4
+                for entry in heapq.nsmallest(n_polish, q):
+                    tour, cost = self._polish_path(entry[-1].path, cost_mat, neighbors, deadline)
+                    if cost < BSSF.get_lowerbound():
+                        BSSF = State.from_route([cities[i] for i in tour], cost)
+                        n_sols += 1
+                        polished += 1
+                        self._improved(cost, count=n_sols, total=State.nstates, pruned=pruned)
+                last_polish = time.perf_counter()
+            if checkpoint is not None and time.perf_counter() - last_save >= checkpoint_interval:
+                save()
+                last_save = time.perf_counter()
+        if checkpoint is not None:
+            save()
         stop = time.perf_counter()
+        State.clear_pool()
         if BSSF.get_lowerbound() != np.inf:
             solution = TSPSolution(BSSF.path)
             results['cost'] = solution.cost
@@ -95,11 +199,41 @@ class TSPSolver:
         else:
             results['cost'] = np.inf
             results['soln'] = None
-        results['time'] = stop - start
+        results['time'] = previous + stop - start
         results['count'] = n_sols
         results['max'] = max_q_size
         results['total'] = State.nstates
         results['pruned'] = pruned
+        results['dominated'] = dominance.pruned
+        results['polished'] = polished
+        results['eliminated'] = eliminated
+        return results
+
+    def _polish_path(self, path, cost_mat, neighbors, deadline):
+        """Complete a partial path greedily, then improve the whole tour with
+        2-opt and Or-opt. Returns the tour (city indices) and its cost."""
+        tour = complete_tour([city._index for city in path], cost_mat)
+        tour = repair_tour(tour, self._scenario._edge_exists)
+        tour, moves = two_opt(tour, cost_mat, neighbors[1], deadline=deadline, clock=time.perf_counter)
+        tour, moves = or_opt(tour, cost_mat, *neighbors, deadline=deadline, clock=time.perf_counter)
+        return tour, cost_mat[tour, np.roll(tour, -1)].sum()
+
+    def hybrid_branch_and_bound(self, time_allowance=60.0, polish_interval=1.0, eliminate=False):
+        """Branch and bound seeded with a greedy-edge tour improved by 2-opt
+        and Or-opt, and tightened by local search from the most promising
+        queued paths every polish_interval seconds. With eliminate, edges
+        the seed rules out are deleted from the scenario before the search
+        (see branchAndBound)."""
+        start = time.time()
+        seed = self.greedy_edge(time_allowance)['soln']
+        if seed.cost < np.inf:
+            seed, moves = self.two_opt_step(seed, start + time_allowance / 10)
+            seed, moves = self.or_opt_step(seed, start + time_allowance / 10)
+        else:
+            seed = None
+        results = self.branchAndBound(time_allowance - (time.time() - start), incumbent=seed,
+                                      polish_interval=polish_interval, eliminate=eliminate)
+        results['time'] = time.time() - start
         return results
 
     def greedy_random(self, time_allowance=60.0):
@@ -111,29 +245,24 @@ class TSPSolver:
         start = time.time()
         while time_allowance > time.time() - start and not done:
             count += 1
-            visited = [False] * ncities
             start_point = np.random.randint(0, ncities)
             route = [cities[start_point]]
-            visited[start_point] = True
             next_point = None
-            visit = False
+            index = nearest_index(self._scenario)
+            index.remove(start_point)
             for i in range(ncities - 1):
                 next_point = None
-                next_dist = np.inf
-                for j in range(ncities):
-                    if j != i and not visited[j]:
-                        if route[i].costTo(cities[j]) < next_dist:
-                            next_dist = route[i].costTo(cities[j])
-                            next_point = cities[j]
-                            visit = j
-                if next_point is None:
+                visit = index.nearest(route[i]._index)
+                if visit is None:
                     break
                 else:
+                    next_point = cities[visit]
                     route.append(next_point)
-                    visited[visit] = True
+                    index.remove(visit)
             soln = TSPSolution(route)
             if soln.cost < np.inf and next_point is not None:
                 done = True
+                self._improved(soln.cost, count=count)
         finish = time.time()
         return {'cost': soln.cost, 'time': finish - start, 'count': count, 'soln': soln, 'max': None, 'total': None,
                 'pruned': None}
@@ -148,32 +277,122 @@ class TSPSolver:
         start = time.time()
         for start_point in range(len(cities)):
             count += 1
-            visited = [False] * ncities
             route = [cities[start_point]]
-            visited[start_point] = True
             next_point = None
-            visit = 0
+            index = nearest_index(self._scenario)
+            index.remove(start_point)
             for i in range(ncities - 1):
                 next_point = None
-                next_dist = np.inf
-                for j in range(ncities):
-                    if j != i and not visited[j]:
-                        if route[i].costTo(cities[j]) < next_dist:
-                            next_dist = route[i].costTo(cities[j])
-                            next_point = cities[j]
-                            visit = j
-                if next_point is None:
+                visit = index.nearest(route[i]._index)
+                if visit is None:
                     break
                 else:
+                    next_point = cities[visit]
                     route.append(next_point)
-                    visited[visit] = True
+                    index.remove(visit)
             soln = TSPSolution(route)
             if (final_soln == None or soln.cost < final_soln.cost) and next_point is not None:
                 final_soln = soln
+                self._improved(soln.cost, count=count)
         finish = time.time()
         return {'cost': final_soln.cost, 'time': finish - start, 'count': count, 'soln': final_soln, 'max': None, 'total': None,
                 'pruned': None}
 
+    def greedy_edge(self, time_allowance=60.0):
+        start = time.time()
+        cities = self._scenario.getCities()
+        soln = TSPSolution([cities[i] for i in greedy_edge_tour(self._scenario)])
+        self._improved(soln.cost, count=1)
+        finish = time.time()
+        return {'cost': soln.cost, 'time': finish - start, 'count': 1, 'soln': soln, 'max': None, 'total': None,
+                'pruned': None}
+
+    def space_filling_curve(self, time_allowance=60.0):
+        start = time.time()
+        cities = self._scenario.getCities()
+        soln = TSPSolution([cities[i] for i in hilbert_tour(self._scenario)])
+        self._improved(soln.cost, count=1)
+        finish = time.time()
+        return {'cost': soln.cost, 'time': finish - start, 'count': 1, 'soln': soln, 'max': None, 'total': None,
+                'pruned': None}
+
+    def cluster_decomposition(self, time_allowance=60.0, cluster_size=200, algorithm='or_opt_local_search',
+                              workers=None):
+        """Solve large scenarios by splitting them into k-means clusters of
+        about cluster_size cities, solving the clusters in parallel worker
+        processes with the named algorithm, and stitching and polishing the
+        cluster tours (see decomposition.decompose_and_solve)."""
+        start = time.time()
+        cities = self._scenario.getCities()
+        tour, clusters = decompose_and_solve(self._scenario, time_allowance, cluster_size, algorithm,
+                                             workers=workers)
+        soln = TSPSolution([cities[i] for i in tour])
+        self._improved(soln.cost, count=clusters)
+        finish = time.time()
+        return {'cost': soln.cost, 'time': finish - start, 'count': clusters, 'soln': soln, 'max': None,
+                'total': None, 'pruned': None}
+
+    def portfolio(self, time_allowance=60.0, members=None):
+        """Race several algorithms in separate processes under one deadline
+        and keep the best tour (see portfolio.race). results['winner'] names
+        the algorithm that found it and results['members'] maps every
+        member to its cost."""
+        start = time.time()
+        results, winner, costs = race(self, time_allowance, members)
+        if results is None:
+            # No member found a tour in time
+            results = {'cost': np.inf, 'soln': None, 'count': 0, 'max': None, 'total': None, 'pruned': None}
+        results = dict(results)
+        results['time'] = time.time() - start
+        results['winner'] = winner
+        results['members'] = costs
+        return results
+
+    def reoptimize(self, previous, time_allowance=60.0, radius=2):
+        """Re-plan after the scenario was changed in place with
+        Scenario.addCity, removeCity or setEdge. The previous TSPSolution's
+        remaining cities keep their order, new cities are added by cheapest
+        insertion and missing edges are repaired. Or-opt and 2-opt then
+        start only from cities within `radius` tour positions of a change,
+        spreading only as far as their moves do."""
+        start = time.time()
+        scenario = self._scenario
+        cities = scenario.getCities()
+        old = previous.route
+        # Cities either side of a removed one
+        dirty = set()
+        for k, city in enumerate(old):
+            if city._scenario is not scenario:
+                for other in (old[k - 1], old[(k + 1) % len(old)]):
+                    if other._scenario is scenario:
+                        dirty.add(other._index)
+        tour = [city._index for city in old if city._scenario is scenario]
+        kept = set(tour)
+        added = [i for i in range(len(cities)) if i not in kept]
+        tour = cheapest_insertion(tour, added, scenario)
+        dirty.update(added)
+        here = np.array(tour)
+        nxt = np.roll(here, -1)
+        broken = ~scenario._edge_exists[here, nxt]
+        dirty.update(here[broken].tolist())
+        dirty.update(nxt[broken].tolist())
+        tour = repair_tour(tour, scenario._edge_exists)
+
+        position = {city: k for k, city in enumerate(tour)}
+        focus = {tour[(position[city] + d) % len(tour)] for city in dirty for d in range(-radius, radius + 1)}
+        # Lazy costs and sparse neighbors keep this O(size of the change)
+        # rather than O(n^2)
+        costs = ScenarioCosts(scenario)
+        neighbors = sparse_neighbor_lists(scenario)
+        deadline = start + time_allowance
+        tour, moves = or_opt(tour, costs, *neighbors, deadline=deadline, clock=time.time, focus=focus)
+        tour, more = two_opt(tour, costs, neighbors[1], deadline=deadline, clock=time.time, focus=focus)
+        soln = TSPSolution([cities[i] for i in tour])
+        self._improved(soln.cost, count=moves + more)
+        finish = time.time()
+        return {'cost': soln.cost, 'time': finish - start, 'count': moves + more, 'soln': soln, 'max': None,
+                'total': len(focus), 'pruned': None}
+
     def n_swap(self, current_soln, n):
         new_soln = np.array(current_soln.route)
         size = len(new_soln)
@@ -186,10 +405,76 @@ class TSPSolver:
         new_soln = TSPSolution(list(new_soln))
         return new_soln
 
+    def two_opt_step(self, soln, deadline=None, neighbors=None, cost_mat=None):
+        """Apply 2-opt moves to a TSPSolution until none improves: all moves
+        evaluated at once as arrays for symmetric (Easy) scenarios, or the
+        neighbor-list moves otherwise. cost_mat defaults to the scenario's
+        (e.g. pass one from elimination.pruned_costs). Returns the (possibly
+        unchanged) solution and the number of moves."""
+        cities = self._scenario.getCities()
+        if cost_mat is None:
+            cost_mat = self._scenario.getCostMatrix()
+        tour = [city._index for city in soln.route]
+        if self._scenario.isSymmetric() and len(cities) <= MATRIX_TWO_OPT_MAX:
+            # Symmetric costs: evaluate the whole neighborhood as arrays
+            tour, moves = two_opt_matrix(tour, cost_mat, deadline=deadline, clock=time.time)
+        else:
+            if neighbors is None:
+                neighbors = neighbor_lists(cost_mat)
+            tour, moves = two_opt(tour, cost_mat, neighbors[1], deadline=deadline, clock=time.time)
+        if moves == 0:
+            return soln, 0
+        new_soln = TSPSolution([cities[i] for i in tour])
+        if new_soln.cost < soln.cost:
+            return new_soln, moves
+        return soln, 0
+
+    def or_opt_step(self, soln, deadline=None, neighbors=None, cost_mat=None):
+        """Apply Or-opt segment moves to a TSPSolution until none improves.
+        cost_mat is as in two_opt_step. Returns the (possibly unchanged)
+        solution and the number of moves."""
+        cities = self._scenario.getCities()
+        if cost_mat is None:
+            cost_mat = self._scenario.getCostMatrix()
+        if neighbors is None:
+            neighbors = neighbor_lists(cost_mat)
+        near_in, near_out = neighbors
+        tour = [city._index for city in soln.route]
+        tour, moves = or_opt(tour, cost_mat, near_in, near_out, deadline=deadline, clock=time.time)
+        if moves == 0:
+            return soln, 0
+        new_soln = TSPSolution([cities[i] for i in tour])
+        if new_soln.cost < soln.cost:
+            return new_soln, moves
+        return soln, 0
+
+    def or_opt_local_search(self, time_allowance=60.0, eliminate=False):
+        start = time.time()
+        soln = self.greedy_random(time_allowance)['soln']
+        cost_mat, neighbors, eliminated = self._search_costs(soln, eliminate)
+        soln, count = self.or_opt_step(soln, start + time_allowance, neighbors, cost_mat)
+        self._improved(soln.cost, count=count)
+        finish = time.time()
+        return {'cost': soln.cost, 'time': finish - start, 'count': count, 'soln': soln, 'max': None, 'total': None,
+                'pruned': None, 'eliminated': eliminated}
 
+    def _search_costs(self, incumbent, eliminate):
+        """Cost matrix and neighbor lists for local searches that must beat
+        the incumbent TSPSolution. With eliminate they come from a copy of
+        the cost matrix without the edges no better tour can use (see
+        elimination.pruned_costs), which shortens the candidate lists; the
+        scenario itself is not changed. Returns them and the number of
+        edges left out."""
+        cost_mat = self._scenario.getCostMatrix()
+        eliminated = 0
+        if eliminate:
+            cost_mat, eliminated = pruned_costs(cost_mat, incumbent.cost)
+        return cost_mat, neighbor_lists(cost_mat), eliminated
 
 
-    def two_swap_local_search(self, time_allowance=60):
+
+
+    def two_swap_local_search(self, time_allowance=60, eliminate=False):
         cities = self._scenario.getCities()
         ncities = len(cities)
         count = 0
@@ -200,27 +485,28 @@ class TSPSolver:
         for i in range(0, numSolutions):
             starting_points.append(self.greedy_random(time_allowance)['soln'])
         start = time.time()
+        cost_mat, neighbors, eliminated = self._search_costs(min(starting_points, key=lambda s: s.cost), eliminate)
 
         for soln in starting_points:
             while (time_allowance/numSolutions) > time.time() - start:
-                improved_soln = soln
-                improved = False
-                for i in range(ncities-1):
-                    for j in range(i+1, ncities):
-                        tweaked_soln = TSPSolution(soln.route[:i] + list(reversed(soln.route[i:j + 1])) + soln.route[j + 1:])
-                        if tweaked_soln.cost < improved_soln.cost:
-                            improved_soln = tweaked_soln
-                            improved = True
-                            count += 1
+                improved_soln, moves = self.two_opt_step(soln, start + time_allowance/numSolutions, neighbors, cost_mat)
+                improved = moves > 0
+                count += moves
                 for i in range(ncities**2//2):
                     tweaked_soln = self.n_swap(soln, n_to_swap)
                     if tweaked_soln.cost < improved_soln.cost:
                         improved_soln = tweaked_soln
                         improved = True
                         count += 1
+                improved_soln, moves = self.or_opt_step(improved_soln, start + time_allowance/numSolutions, neighbors,
+                                                        cost_mat)
+                if moves:
+                    improved = True
+                    count += moves
                 if not improved:
                     break
                 soln = improved_soln
+                self._improved(soln.cost, count=count)
             solutions.append(soln)
 
         soln = solutions[0]
@@ -229,7 +515,7 @@ class TSPSolver:
                 soln = s
         finish = time.time()
         return {'cost': soln.cost, 'time': finish - start, 'count': count, 'soln': soln, 'max': None, 'total': None,
-                'pruned': None}
+                'pruned': None, 'eliminated': eliminated}
 
     def local_search_tournament(self, time_allowance=60):
         cities = self._scenario.getCities()
@@ -259,12 +545,149 @@ class TSPSolver:
                                 soln = route
                                 improved = True
                                 count += 1
+                                self._improved(soln.cost, count=count)
+            soln, moves = self.or_opt_step(soln, start + int(time_allowance/2))
+            if moves:
+                improved = True
+                count += moves
+                self._improved(soln.cost, count=count)
 
         finish = time.time()
 
         return {'cost': soln.cost, 'time': finish - start, 'count': count, 'soln': soln, 'max': None, 'total': None,
                 'pruned': None}
 
+    def ant_colony(self, time_allowance=60.0, n_ants=20, alpha=1.0, beta=3.0, rho=0.1, n_polish=1, patience=50):
+        """Ant colony optimization (MAX-MIN style). Each iteration builds a
+        batch of n_ants tours, polishes the n_polish best with Or-opt, and
+        reinforces the iteration-best and best-so-far tours. Stops at the
+        time limit or after `patience` iterations without improvement."""
+        start = time.time()
+        cities = self._scenario.getCities()
+        cost_mat = self._scenario.getCostMatrix()
+        colony = AntColony(cost_mat, alpha, beta, rho)
+        neighbors = neighbor_lists(cost_mat)
+        best_tour = None
+        best_cost = np.inf
+        count = 0
+        total = 0
+        stagnant = 0
+        while time.time() - start < time_allowance and stagnant < patience:
+            tours, costs = colony.construct(n_ants)
+            total += n_ants
+            order = np.argsort(costs)
+            for ant in order[:n_polish]:
+                if costs[ant] == np.inf:
+                    break
+                tour, moves = or_opt(list(tours[ant]), cost_mat, *neighbors, deadline=start + time_allowance,
+                                     clock=time.time)
+                tours[ant] = tour
+            costs = colony.tour_costs(tours)
+            ant = int(np.argmin(costs))
+            stagnant += 1
+            if costs[ant] < best_cost:
+                best_cost = costs[ant]
+                best_tour = tours[ant].copy()
+                colony.set_best(best_cost)
+                count += 1
+                stagnant = 0
+                self._improved(best_cost, count=count, total=total)
+            if best_tour is not None:
+                colony.update([tours[ant], best_tour], [costs[ant], best_cost])
+        soln = TSPSolution([cities[i] for i in best_tour]) if best_tour is not None else None
+        finish = time.time()
+        return {'cost': soln.cost if soln else math.inf, 'time': finish - start, 'count': count, 'soln': soln,
+                'max': None, 'total': total, 'pruned': None}
+
+    def tabu_search(self, time_allowance=60.0, tenure=10, patience=1000, eliminate=False):
+        """Tabu search (see local_search.tabu_search) from a greedy-edge tour
+        polished with Or-opt. results['iterations_per_sec'] and
+        results['aspirations'] report the search speed and how often a tabu
+        move was allowed because it gave a new best tour. With eliminate,
+        the search leaves out the edges the polished tour rules out."""
+        start = time.time()
+        cities = self._scenario.getCities()
+        cost_mat = self._scenario.getCostMatrix()
+        neighbors = neighbor_lists(cost_mat)
+        soln, moves = self.or_opt_step(self.greedy_edge(time_allowance)['soln'], start + time_allowance, neighbors)
+        self._improved(soln.cost)
+        eliminated = 0
+        if eliminate:
+            cost_mat, neighbors, eliminated = self._search_costs(soln, eliminate)
+        search_start = time.time()
+        tour, cost, stats = tabu_search([city._index for city in soln.route], cost_mat, *neighbors, tenure=tenure,
+                                        patience=patience, deadline=start + time_allowance, clock=time.time)
+        if cost < soln.cost:
+            soln = TSPSolution([cities[i] for i in tour])
+            self._improved(soln.cost, count=stats['improvements'])
+        finish = time.time()
+        return {'cost': soln.cost, 'time': finish - start, 'count': stats['improvements'], 'soln': soln,
+                'max': None, 'total': stats['iterations'], 'pruned': None,
+                'iterations_per_sec': stats['iterations'] / max(finish - search_start, 1e-9),
+                'aspirations': stats['aspirations'], 'eliminated': eliminated}
+
+    def simulated_annealing(self, time_allowance=60.0, batch=256):
+        """Simulated annealing (see annealing.anneal) from a greedy-edge tour
+        polished with Or-opt, proposing and scoring batch moves at a time.
+        results['accepted'] and results['reheats'] report how many moves were
+        taken and how often the search restarted from its best tour."""
+        start = time.time()
+        cities = self._scenario.getCities()
+        cost_mat = self._scenario.getCostMatrix()
+        soln, moves = self.or_opt_step(self.greedy_edge(time_allowance)['soln'], start + time_allowance)
+        self._improved(soln.cost)
+        tour, cost, stats = anneal([city._index for city in soln.route], cost_mat, start + time_allowance,
+                                   time.time, batch=batch)
+        if cost < soln.cost:
+            soln = TSPSolution([cities[i] for i in tour])
+            self._improved(soln.cost, count=stats['improvements'])
+        finish = time.time()
+        return {'cost': soln.cost, 'time': finish - start, 'count': stats['improvements'], 'soln': soln,
+                'max': None, 'total': stats['proposals'], 'pruned': None,
+                'accepted': stats['accepted'], 'reheats': stats['reheats']}
+
+    def symmetric_transform(self, time_allowance=60.0, tenure=10, patience=1000):
+        """Local search with the symmetric engines. An asymmetric (Normal or
+        Hard) scenario is first turned into an equivalent symmetric one of
+        2n cities (see doubling.double_costs); the tour is improved there
+        and mapped back. A 2-opt move always breaks a locked ghost edge of
+        a doubled tour, so Or-opt (with segments of up to 3 cities, 6
+        doubled) and tabu search over Or-opt moves do the work; an Easy
+        scenario is already symmetric and also gets full-neighborhood
+        2-opt. results['doubled'] says whether the scenario was doubled."""
+        start = time.time()
+        deadline = start + time_allowance
+        cities = self._scenario.getCities()
+        n = len(cities)
+        cost_mat = self._scenario.getCostMatrix()
+        soln = self.greedy_edge(time_allowance)['soln']
+        self._improved(soln.cost)
+        tour = [city._index for city in soln.route]
+        doubled = not self._scenario.isSymmetric()
+        if doubled:
+            sym_mat, K = double_costs(cost_mat)
+            tour = double_tour(tour, n)
+            max_seg = 6
+        else:
+            sym_mat = cost_mat
+            max_seg = 3
+            if n <= MATRIX_TWO_OPT_MAX:
+                tour, moves = two_opt_matrix(tour, sym_mat, deadline=deadline, clock=time.time)
+        # One more neighbor, since each city's nearest is its own ghost
+        neighbors = neighbor_lists(sym_mat, k=9 if doubled else 8)
+        tour, moves = or_opt(tour, sym_mat, *neighbors, max_seg=max_seg, deadline=deadline, clock=time.time)
+        tour, cost, stats = tabu_search(tour, sym_mat, *neighbors, tenure=tenure, max_seg=max_seg,
+                                        patience=patience, deadline=deadline, clock=time.time)
+        if doubled:
+            tour = undouble_tour(tour, n)
+        new_soln = TSPSolution([cities[i] for i in tour])
+        if new_soln.cost < soln.cost:
+            soln = new_soln
+            self._improved(soln.cost, count=stats['improvements'])
+        finish = time.time()
+        return {'cost': soln.cost, 'time': finish - start, 'count': stats['improvements'], 'soln': soln,
+                'max': None, 'total': stats['iterations'], 'pruned': None, 'doubled': doubled}
+
     def old_fancy2(self, time_allowance=60.0):
         cities = self._scenario.getCities()
         ncities = len(cities)
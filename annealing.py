@@ -0,0 +1,146 @@
+import math
+
+import numpy as np
+
+
+MOVE_REVERSE, MOVE_SWAP, MOVE_RELOCATE = 0, 1, 2
+
+
+def propose(tour, cost_mat, size, rng=np.random):
+    """Draw a batch of random moves and score them all against the tour
+    (an index array) at once. Returns (kind, a, b, c, delta, lo, hi) arrays:
+
+    reverse  -- reverse positions a+1..b (2-opt)
+    swap     -- exchange the cities at positions a and b
+    relocate -- move positions a..b to just after position c (Or-opt)
+
+    lo..hi are the positions a move reads or changes. The edge from the
+    last position back to the first is never touched, so no move has to
+    wrap around. Impossible proposals and moves that would use a missing
+    edge get delta np.inf. O(size) after O(n) prefix sums."""
+    n = len(tour)
+    # fwd[k] is edge k -> k+1 and bwd[k] is that edge travelled backwards;
+    # prefix sums give the cost of any reversed path in O(1)
+    fwd = cost_mat[tour[:-1], tour[1:]]
+    bwd = cost_mat[tour[1:], tour[:-1]]
+    with np.errstate(invalid='ignore'):
+        fsum = np.concatenate([[0.0], np.cumsum(fwd)])
+        bsum = np.concatenate([[0.0], np.cumsum(bwd)])
+    kind = rng.randint(0, 3, size)
+    x = rng.randint(0, n - 1, size)
+    y = rng.randint(0, n - 1, size)
+    a = np.minimum(x, y)
+    b = np.maximum(x, y)
+    c = np.zeros(size, dtype=int)
+    delta = np.full(size, np.inf)
+    lo = a.copy()
+    hi = b + 1
+
+    with np.errstate(invalid='ignore'):
+        # Reverse a+1..b: edges a->a+1 and b->b+1 are replaced and the path
+        # between them is travelled the other way
+        m = (kind == MOVE_REVERSE) & (b - a >= 2)
+        i, j = a[m], b[m]
+        delta[m] = (cost_mat[tour[i], tour[j]] + cost_mat[tour[i + 1], tour[j + 1]] - fwd[i] - fwd[j]
+                    + (bsum[j] - bsum[i + 1]) - (fsum[j] - fsum[i + 1]))
+
+        # Swap a and b, which must not be neighbors
+        m = (kind == MOVE_SWAP) & (a >= 1) & (b - a >= 2)
+        i, j = a[m], b[m]
+        delta[m] = (cost_mat[tour[i - 1], tour[j]] + cost_mat[tour[j], tour[i + 1]]
+                    + cost_mat[tour[j - 1], tour[i]] + cost_mat[tour[i], tour[j + 1]]
+                    - fwd[i - 1] - fwd[i] - fwd[j - 1] - fwd[j])
+        lo[m] = i - 1
+
+        # Relocate a segment of 1 to 3 cities starting at x to after y
+        m = kind == MOVE_RELOCATE
+        s = x[m]
+        e = np.minimum(s + rng.randint(0, 3, m.sum()), n - 2)
+        t = y[m]
+        ok = (s >= 1) & ((t < s - 1) | (t > e))
+        d = (cost_mat[tour[s - 1], tour[e + 1]] + cost_mat[tour[t], tour[s]] + cost_mat[tour[e], tour[t + 1]]
+             - fwd[s - 1] - fwd[e] - fwd[t])
+        a[m] = s
+        b[m] = e
+        c[m] = t
+        delta[m] = np.where(ok, d, np.inf)
+        lo[m] = np.minimum(s - 1, t)
+        hi[m] = np.maximum(e + 1, t + 1)
+    delta[np.isnan(delta)] = np.inf
+    return kind, a, b, c, delta, lo, hi
+
+
+def apply_move(tour, kind, a, b, c):
+    """Apply one move from propose() to the tour array in place."""
+    if kind == MOVE_REVERSE:
+        tour[a + 1:b + 1] = tour[a + 1:b + 1][::-1].copy()
+    elif kind == MOVE_SWAP:
+        tour[a], tour[b] = tour[b], tour[a]
+    elif c > b:
+        tour[a:c + 1] = np.concatenate([tour[b + 1:c + 1], tour[a:b + 1]])
+    else:
+        tour[c + 1:b + 1] = np.concatenate([tour[a:b + 1], tour[c + 1:a]])
+
+
+def anneal(tour, cost_mat, deadline, clock, batch=256, final_ratio=1e-3, stagnation=0.1, reheat=0.25,
+           rng=np.random):
+    """Simulated annealing from a tour (list of city indices) until the
+    deadline. Moves are proposed and scored in batches; the ones that pass
+    the Metropolis test are then applied in order, skipping any that read
+    a position an earlier move in the batch changed (their scores would be
+    stale). The temperature falls geometrically over the remaining time
+    from a start value chosen so that a typical worsening move is accepted
+    half the time, down to final_ratio of it. After a `stagnation` fraction
+    of the time without a new best tour, the search restarts from the best
+    tour at `reheat` times the start temperature. Moves onto missing edges
+    score np.inf and are never accepted.
+
+    Returns the best tour, its cost and a dict of counts: proposals,
+    accepted, improvements and reheats."""
+    tour = np.array(tour)
+    n = len(tour)
+    stats = {'proposals': 0, 'accepted': 0, 'improvements': 0, 'reheats': 0}
+    cost = cost_mat[tour, np.roll(tour, -1)].sum()
+    best_tour = tour.copy()
+    best_cost = cost
+    if n < 5:
+        return best_tour.tolist(), best_cost, stats
+    start = clock()
+    delta = propose(tour, cost_mat, batch, rng)[4]
+    worse = delta[(delta > 0) & np.isfinite(delta)]
+    t_hot = t_start = (worse.mean() if len(worse) else 1.0) / math.log(2.0)
+    phase = start
+    last_best = start
+    while True:
+        now = clock()
+        if now > deadline:
+            break
+        if now - last_best > stagnation * (deadline - start):
+            tour = best_tour.copy()
+            cost = best_cost
+            t_hot = t_start * reheat
+            phase = last_best = now
+            stats['reheats'] += 1
+        frac = (now - phase) / max(deadline - phase, 1e-9)
+        temperature = t_hot * final_ratio ** frac
+        # Rotate so the edge that moves never touch is a different one
+        tour = np.roll(tour, -rng.randint(n))
+        kind, a, b, c, delta, lo, hi = propose(tour, cost_mat, batch, rng)
+        stats['proposals'] += batch
+        with np.errstate(over='ignore'):
+            accept = (delta <= 0) | (rng.random_sample(batch) < np.exp(-delta / temperature))
+        dirty = np.zeros(n, dtype=bool)
+        for k in np.flatnonzero(accept & np.isfinite(delta)).tolist():
+            if dirty[lo[k]:hi[k] + 1].any():
+                continue
+            apply_move(tour, kind[k], a[k], b[k], c[k])
+            dirty[lo[k]:hi[k] + 1] = True
+            stats['accepted'] += 1
+        # Recomputed rather than summed from deltas, so it is exact
+        cost = cost_mat[tour, np.roll(tour, -1)].sum()
+        if cost < best_cost:
+            best_cost = cost
+            best_tour = tour.copy()
+            stats['improvements'] += 1
+            last_best = now
+    return best_tour.tolist(), best_cost, stats
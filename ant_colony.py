@@ -0,0 +1,73 @@
+import numpy as np
+
+
+class AntColony:
+    """Pheromone and visibility matrices for ant colony optimization over a
+    dense cost matrix (np.inf marks a missing edge). Tours are built for a
+    whole batch of ants at once, one step per column."""
+
+    def __init__(self, cost_mat, alpha=1.0, beta=3.0, rho=0.1):
+        self.cost_mat = cost_mat
+        self.n = len(cost_mat)
+        self.alpha = alpha
+        self.beta = beta
+        self.rho = rho
+        finite = np.isfinite(cost_mat)
+        # Visibility is 1/cost, and zero for missing edges so that ants can
+        # never take them
+        self.visibility = np.zeros(cost_mat.shape)
+        self.visibility[finite] = 1.0 / np.maximum(cost_mat[finite], 1.0)
+        mean_cost = cost_mat[finite].mean() if finite.any() else 1.0
+        self.tau_max = 1.0 / (rho * self.n * mean_cost)
+        self.tau_min = self.tau_max / (2.0 * self.n)
+        self.pheromone = np.full(cost_mat.shape, self.tau_max)
+
+    def construct(self, n_ants, rng=np.random):
+        """Build n_ants tours with roulette-wheel selection. Returns an
+        (n_ants, n) array of city indices and their costs; ants that hit a
+        dead end get cost np.inf. O(n_ants * n^2)"""
+        n = self.n
+        weights = self.pheromone ** self.alpha * self.visibility ** self.beta
+        tours = np.empty((n_ants, n), dtype=int)
+        tours[:, 0] = rng.randint(0, n, n_ants)
+        unvisited = np.ones((n_ants, n), dtype=bool)
+        ants = np.arange(n_ants)
+        unvisited[ants, tours[:, 0]] = False
+        alive = np.ones(n_ants, dtype=bool)
+        for step in range(1, n):
+            # Attractiveness of each unvisited city from each ant's position
+            w = weights[tours[:, step - 1]] * unvisited
+            cum = np.cumsum(w, axis=1)
+            total = cum[:, -1]
+            # Ants with no usable edge are dead; they are still given some
+            # unvisited city so their tour stays a permutation
+            stuck = total <= 0.0
+            alive &= ~stuck
+            pick = (cum < (rng.random_sample(n_ants) * total)[:, np.newaxis]).sum(axis=1)
+            pick = np.minimum(pick, n - 1)
+            if stuck.any():
+                pick[stuck] = unvisited[stuck].argmax(axis=1)
+            tours[:, step] = pick
+            unvisited[ants, pick] = False
+        costs = self.tour_costs(tours)
+        costs[~alive] = np.inf
+        return tours, costs
+
+    def tour_costs(self, tours):
+        """Cost of each row of tours, including the edge back to the start."""
+        return self.cost_mat[tours, np.roll(tours, -1, axis=1)].sum(axis=1)
+
+    def update(self, tours, costs):
+        """Evaporate all trails, then deposit 1/cost on the edges of each
+        given finite-cost tour. Trails are kept within [tau_min, tau_max]."""
+        self.pheromone *= (1.0 - self.rho)
+        for tour, cost in zip(tours, costs):
+            if cost < np.inf:
+                self.pheromone[tour, np.roll(tour, -1)] += 1.0 / max(cost, 1.0)
+        np.clip(self.pheromone, self.tau_min, self.tau_max, out=self.pheromone)
+
+    def set_best(self, cost):
+        """Tie the trail limits to the best tour cost found so far, as in
+        MAX-MIN ant systems."""
+        self.tau_max = 1.0 / (self.rho * max(cost, 1.0))
+        self.tau_min = self.tau_max / (2.0 * self.n)
@@ -0,0 +1,51 @@
+import time
+
+import numpy as np
+
+
+class AnytimeProfile:
+    """Improvement trajectory of a solver run: (elapsed seconds, cost,
+    counters) for every new best tour, timed from when the profile was
+    created. Set one as TSPSolver.profile before a run to record it;
+    recording is a comparison and an append, and only happens when the
+    cost improves."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.points = []
+        self.best = np.inf
+
+    def record(self, cost, counters=None):
+        if cost < self.best:
+            self.best = cost
+            self.points.append((time.perf_counter() - self.start, cost, counters or {}))
+
+
+def cost_at(points, times):
+    """The best cost found by each of the given times (np.inf before the
+    first tour), as an array. O((len(points) + len(times)) log)"""
+    if not points:
+        return np.full(len(times), np.inf)
+    elapsed = np.array([t for t, c, counters in points])
+    costs = np.array([c for t, c, counters in points])
+    at = np.searchsorted(elapsed, times, side='right') - 1
+    return np.where(at >= 0, costs[np.maximum(at, 0)], np.inf)
+
+
+def time_to_target(points, target):
+    """Seconds until a tour costing at most target was found, or None."""
+    for t, cost, counters in points:
+        if cost <= target:
+            return t
+    return None
+
+
+def area_under_curve(points, horizon, reference, samples=200):
+    """Mean relative gap (cost / reference - 1, capped at 1, and 1 before
+    the first tour) over [0, horizon], so 0 means the reference cost was
+    reached at once and 1 means nothing useful was found. Sampled at
+    log-spaced times, which weights early progress the way anytime
+    comparisons usually do."""
+    times = np.geomspace(horizon / 1000.0, horizon, samples)
+    gap = np.minimum(cost_at(points, times) / reference - 1.0, 1.0)
+    return float(gap.mean())
@@ -0,0 +1,287 @@
+#!/usr/bin/python3
+"""Micro-benchmarks for the solver hot paths.
+
+Each benchmark runs on fixed-seed scenarios of several sizes and reports a
+throughput (operations per second). Results are compared against the stored
+baseline and any benchmark slower than the baseline by more than the
+tolerance is flagged as a regression.
+
+    python benchmark.py                 # run and compare with the baseline
+    python benchmark.py --save          # run and store as the new baseline
+    python benchmark.py --tolerance 0.3 # allow 30% slowdown
+    python benchmark.py --anytime       # anytime curves of whole solvers
+
+The anytime mode runs whole solvers over several seeds while recording
+their improvement trajectories, and reports for each size and algorithm
+the mean gap to the best known cost at several times, the time to reach
+a target cost (within TARGET_GAP of the best known) and the area under
+the gap curve.
+"""
+
+from which_pyqt import PYQT_VER
+
+if PYQT_VER == 'PYQT5':
+    from PyQt5.QtCore import QPointF
+elif PYQT_VER == 'PYQT4':
+    from PyQt4.QtCore import QPointF
+else:
+    raise Exception('Unsupported Version of PyQt: {}'.format(PYQT_VER))
+
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+
+import numpy as np
+
+from TSPClasses import EdgeSet, Scenario, TSPSolution
+from TSPSolver import TSPSolver
+from state import State
+from anytime import AnytimeProfile, area_under_curve, cost_at, time_to_target
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+SIZES = [15, 30, 60, 100]
+DIFFICULTY = 'Hard (Deterministic)'
+SEED = 20
+TOLERANCE = 0.25
+ANYTIME_ALGORITHMS = ['greedy', 'or_opt_local_search', 'two_swap_local_search', 'ant_colony', 'branchAndBound',
+                      'hybrid_branch_and_bound']
+ANYTIME_SEEDS = [20, 21, 22, 23, 24]
+# Fractions of the time limit at which the anytime curves are reported
+ANYTIME_SAMPLES = [0.001, 0.01, 0.1, 0.5, 1.0]
+TARGET_GAP = 0.05
+
+
+def make_scenario(n, difficulty=DIFFICULTY, seed=SEED):
+    """Build a scenario the same way Proj5GUI.generateNetwork does."""
+    random.seed(seed)
+    np.random.seed(seed)
+    points = []
+    for i in range(n):
+        x = random.uniform(0.0, 1.0)
+        y = random.uniform(0.0, 1.0)
+        points.append(QPointF(-1.5 + 3.0*x, -1.0 + 2.0*y))
+    return Scenario(city_locations=points, difficulty=difficulty, rand_seed=seed)
+
+
+def make_solver(scenario):
+    solver = TSPSolver(None)
+    solver.setupWithScenario(scenario)
+    return solver
+
+
+def start_tour(scenario):
+    """A fixed-seed greedy tour to start tour-based benchmarks from."""
+    np.random.seed(SEED)
+    return make_solver(scenario).greedy_random()['soln']
+
+
+# Each benchmark takes a scenario and returns (function, ops per call)
+
+def bench_cost_to(scenario):
+    cities = scenario.getCities()
+    pairs = [(a, b) for a in cities for b in cities]
+    def run():
+        for a, b in pairs:
+            a.costTo(b)
+    return run, len(pairs)
+
+
+def bench_solution(scenario):
+    route = start_tour(scenario).route
+    return lambda: TSPSolution(route), 1
+
+
+def bench_state_root(scenario):
+    city = scenario.getCities()[0]
+    def run():
+        State(city).release()
+    return run, 1
+
+
+def bench_state_expand(scenario):
+    root = State(scenario.getCities()[0])
+    def run():
+        for child in root.expand():
+            child.release()
+    return run, 1
+
+
+def bench_reduce(scenario):
+    root = State(scenario.getCities()[0])
+    matrix = np.copy(root.cost_mat)
+    def run():
+        np.copyto(root.cost_mat, matrix)
+        root.reduce_cost_matrix()
+    return run, 1
+
+
+def bench_two_opt(scenario):
+    solver = make_solver(scenario)
+    soln = start_tour(scenario)
+    return lambda: solver.two_opt_step(soln), 1
+
+
+def bench_greedy(scenario):
+    solver = make_solver(scenario)
+    def run():
+        np.random.seed(SEED)
+        solver.greedy_random()
+    return run, 1
+
+
+def bench_thin_edges(scenario):
+    ncities = len(scenario.getCities())
+    def run():
+        np.random.seed(SEED)
+        scenario._edge_exists = EdgeSet(ncities)
+        scenario.thinEdges()
+    return run, 1
+
+
+BENCHMARKS = [
+    ('City.costTo', bench_cost_to),
+    ('TSPSolution', bench_solution),
+    ('State.__init__', bench_state_root),
+    ('State.expand', bench_state_expand),
+    ('State.reduce_cost_matrix', bench_reduce),
+    ('two_opt_step', bench_two_opt),
+    ('greedy_random', bench_greedy),
+    ('Scenario.thinEdges', bench_thin_edges),
+]
+
+
+def run_benchmarks(sizes=SIZES, repeat=3):
+    """Time every benchmark at every size. Returns {name: {size: ops/sec}}
+    using the best of `repeat` timings."""
+    results = {}
+    for name, bench in BENCHMARKS:
+        results[name] = {}
+        for n in sizes:
+            func, ops = bench(make_scenario(n))
+            timer = timeit.Timer(func)
+            number, _ = timer.autorange()
+            best = min(timer.repeat(repeat=repeat, number=number))
+            results[name][str(n)] = ops * number / best
+    return results
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Return a list of (name, size, ops/sec, baseline ops/sec) for every
+    benchmark more than `tolerance` slower than its baseline."""
+    regressions = []
+    for name, sizes in results.items():
+        for n, rate in sizes.items():
+            base = baseline.get(name, {}).get(n)
+            if base is not None and rate < base * (1.0 - tolerance):
+                regressions.append((name, n, rate, base))
+    return regressions
+
+
+def run_anytime(sizes, seeds=ANYTIME_SEEDS, algorithms=ANYTIME_ALGORITHMS, time_allowance=10.0):
+    """Run every algorithm on every (size, seed) scenario with an anytime
+    profile. Returns {size: {seed: {algorithm: points}}}."""
+    runs = {}
+    for n in sizes:
+        runs[n] = {}
+        for seed in seeds:
+            scenario = make_scenario(n, seed=seed)
+            solver = make_solver(scenario)
+            runs[n][seed] = {}
+            for name in algorithms:
+                np.random.seed(seed)
+                random.seed(seed)
+                solver.profile = AnytimeProfile()
+                getattr(solver, name)(time_allowance)
+                runs[n][seed][name] = solver.profile.points
+    return runs
+
+
+def anytime_report(runs, time_allowance, target_gap=TARGET_GAP):
+    """Summarize anytime runs. The reference cost of each scenario is the
+    best cost any algorithm found on it. Returns a list of rows: (size,
+    algorithm, mean gap at each ANYTIME_SAMPLES time, median time to
+    target or None, runs reaching the target, mean area under curve)."""
+    rows = []
+    times = np.array(ANYTIME_SAMPLES) * time_allowance
+    for n, by_seed in runs.items():
+        reference = {seed: min(points[-1][1] for points in algs.values() if points)
+                     for seed, algs in by_seed.items()}
+        for name in next(iter(by_seed.values())):
+            gaps = []
+            ttt = []
+            auc = []
+            for seed, algs in by_seed.items():
+                points = algs[name]
+                gaps.append(cost_at(points, times) / reference[seed] - 1.0)
+                t = time_to_target(points, reference[seed] * (1.0 + target_gap))
+                if t is not None:
+                    ttt.append(t)
+                auc.append(area_under_curve(points, time_allowance, reference[seed]))
+            rows.append((n, name, np.mean(gaps, axis=0), np.median(ttt) if ttt else None, len(ttt),
+                         float(np.mean(auc))))
+    return rows
+
+
+def print_anytime(rows, nseeds):
+    print('Mean gap to the best known cost at each fraction of the time limit, median time to within '
+          '{:.0%} of it, runs reaching that target, and area under the gap curve'.format(TARGET_GAP))
+    header = ''.join('{:>9g}'.format(f) for f in ANYTIME_SAMPLES)
+    print('{:<6}{:<26}{}{:>10}{:>6}{:>8}'.format('n', 'algorithm', header, 'TTT', 'hit', 'AUC'))
+    for n, name, gaps, ttt, hits, auc in rows:
+        curve = ''.join('{:>9}'.format('-' if g == np.inf else '{:.1%}'.format(g)) for g in gaps)
+        ttt = '-' if ttt is None else '{:.3f}s'.format(ttt)
+        print('{:<6}{:<26}{}{:>10}{:>6}{:>8.3f}'.format(n, name, curve, ttt, '{}/{}'.format(hits, nseeds), auc))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Micro-benchmarks for the TSP solver hot paths.')
+    parser.add_argument('--save', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help='allowed fractional slowdown before flagging a regression')
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--anytime', action='store_true', help='report anytime curves of whole solvers')
+    parser.add_argument('--time-limit', type=float, default=10.0, help='time limit per anytime run')
+    parser.add_argument('--seeds', type=int, nargs='+', default=ANYTIME_SEEDS)
+    parser.add_argument('--algorithms', nargs='+', default=ANYTIME_ALGORITHMS)
+    parser.add_argument('--curves', help='also write the raw anytime points to this JSON file')
+    args = parser.parse_args(argv)
+
+    if args.anytime:
+        runs = run_anytime(args.sizes, args.seeds, args.algorithms, args.time_limit)
+        print_anytime(anytime_report(runs, args.time_limit), len(args.seeds))
+        if args.curves:
+            with open(args.curves, 'w') as f:
+                json.dump({n: {seed: {name: [(t, c) for t, c, counters in points] for name, points in algs.items()}
+                               for seed, algs in by_seed.items()} for n, by_seed in runs.items()}, f, indent=1)
+        return 0
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = run_benchmarks(args.sizes)
+    for name, sizes in results.items():
+        for n, rate in sizes.items():
+            base = baseline.get(name, {}).get(n)
+            change = '' if base is None else '{:+7.1%}'.format(rate / base - 1.0)
+            print('{:<26}{:>6}{:>16.1f} ops/s  {}'.format(name, n, rate, change))
+
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print('Saved baseline to {}'.format(args.baseline))
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    for name, n, rate, base in regressions:
+        print('REGRESSION: {} ({} cities) {:.1f} ops/s vs baseline {:.1f}'.format(name, n, rate, base))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
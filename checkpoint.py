@@ -0,0 +1,52 @@
+import os
+import pickle
+
+import numpy as np
+
+from result_cache import scenario_key
+
+
+CHECKPOINT_VERSION = 1
+
+
+def save_checkpoint(filename, scenario, bssf, queue, dominance, counters, params):
+    """Write branch-and-bound progress to filename. The queue is a list of
+    (tiebreak, state) pairs; each state is stored only as its path of city
+    indices, packed into one flat array plus an array of lengths, since
+    its cost matrix and bound can be rebuilt by replaying the path. The
+    file is replaced atomically, so a crash mid-write keeps the previous
+    checkpoint."""
+    queue = sorted(queue, key=lambda entry: entry[0])
+    paths = [[city._index for city in state.path] for _, state in queue]
+    data = {
+        'version': CHECKPOINT_VERSION,
+        'scenario': scenario_key(scenario),
+        'params': params,
+        'counters': counters,
+        'bssf_path': None if bssf.get_lowerbound() == np.inf else [city._index for city in bssf.path],
+        'bssf_bound': bssf.get_lowerbound(),
+        'queue_lengths': np.array([len(path) for path in paths], dtype=np.int32),
+        'queue_cities': np.array([i for path in paths for i in path], dtype=np.int32),
+        'dominance': dominance.best,
+        'dominance_pruned': dominance.pruned,
+    }
+    tmp = '{}.{}.tmp'.format(filename, os.getpid())
+    with open(tmp, 'wb') as f:
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, filename)
+
+
+def load_checkpoint(filename, scenario):
+    """Read a checkpoint written by save_checkpoint for the same scenario.
+    Returns its data dict with the queue unpacked into 'queue_paths', a
+    list of city index lists in their original queue order."""
+    with open(filename, 'rb') as f:
+        data = pickle.load(f)
+    if data.get('version') != CHECKPOINT_VERSION:
+        raise ValueError('Unsupported checkpoint version in {}'.format(filename))
+    if data['scenario'] != scenario_key(scenario):
+        raise ValueError('Checkpoint {} was written for a different scenario'.format(filename))
+    ends = np.cumsum(data['queue_lengths'])
+    cities = data['queue_cities'].tolist()
+    data['queue_paths'] = [cities[end - length:end] for end, length in zip(ends.tolist(), data['queue_lengths'].tolist())]
+    return data
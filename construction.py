@@ -0,0 +1,243 @@
+import numpy as np
+
+from spatial import nearest_neighbors
+
+
+HILBERT_ORDER = 16
+
+
+def hilbert_index(xs, ys, order=HILBERT_ORDER):
+    """Position of each point along a Hilbert curve covering the bounding
+    box of the points, computed for all points at once. O(n * order)"""
+    side = (1 << order) - 1
+    span = max(xs.max() - xs.min(), ys.max() - ys.min(), 1e-12)
+    x = ((xs - xs.min()) / span * side).astype(np.int64)
+    y = ((ys - ys.min()) / span * side).astype(np.int64)
+    d = np.zeros(len(xs), dtype=np.int64)
+    s = 1 << (order - 1)
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        d += s * s * ((3 * rx) ^ ry)
+        # Rotate the quadrant so the curve stays continuous
+        flip = ~ry & rx
+        x = np.where(flip, side - x, x)
+        y = np.where(flip, side - y, y)
+        swap = ~ry
+        x, y = np.where(swap, y, x), np.where(swap, x, y)
+        s >>= 1
+    return d
+
+
+def hilbert_tour(scenario):
+    """Visit the cities in Hilbert-curve order, then repair any missing
+    edges. O(n log n)"""
+    xs, ys, _ = scenario._coords
+    tour = np.argsort(hilbert_index(xs, ys), kind='stable')
+    return repair_tour(list(tour), scenario._edge_exists)
+
+
+def candidate_pairs(scenario, k=8):
+    """Near-neighbor candidate edges: each city paired with its k nearest
+    cities by straight-line distance, found with a grid index. Returns
+    (src, dst) index arrays. O(n) for evenly spread cities."""
+    xs, ys, _ = scenario._coords
+    nearest = nearest_neighbors(xs, ys, k)
+    src = np.repeat(np.arange(len(xs)), nearest.shape[1])
+    dst = nearest.ravel()
+    keep = dst >= 0
+    return src[keep], dst[keep]
+
+
+def greedy_edge_tour(scenario, k=8):
+    """Greedy-edge (matching) construction. Candidate edges are weighted by
+    the sum of their costs in both directions (so edges missing either way
+    are never picked), sorted once, and accepted cheapest
+    first whenever both cities have fewer than two tour edges and the edge
+    does not close a cycle (checked with union-find). The path fragments
+    left over are joined by a second greedy pass over all pairs of fragment
+    endpoints. The tour is then oriented in its cheaper direction and
+    missing edges are repaired. O(n log n) plus O(F^2 log F) for the F
+    fragments, which are a small fraction of n."""
+    n = len(scenario.getCities())
+    if n < 3:
+        return list(range(n))
+    src, dst = candidate_pairs(scenario, k)
+    adj = [[] for i in range(n)]
+    parent = list(range(n))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def join(src, dst, joined):
+        weight = scenario.costsBetween(src, dst) + scenario.costsBetween(dst, src)
+        keep = np.isfinite(weight)
+        order = np.argsort(weight[keep], kind='stable')
+        for a, b in zip(src[keep][order].tolist(), dst[keep][order].tolist()):
+            if len(adj[a]) == 2 or len(adj[b]) == 2:
+                continue
+            ra = find(a)
+            rb = find(b)
+            if ra == rb:
+                continue
+            parent[ra] = rb
+            adj[a].append(b)
+            adj[b].append(a)
+            joined += 1
+            if joined == n - 1:
+                break
+        return joined
+
+    joined = join(src, dst, 0)
+    if joined < n - 1:
+        ends = np.array([i for i in range(n) if len(adj[i]) < 2])
+        a, b = np.triu_indices(len(ends), 1)
+        joined = join(ends[a], ends[b], joined)
+
+    # Walk each path (one, unless missing edges left several) from an end
+    tour = []
+    seen = [False] * n
+    for start in range(n):
+        if seen[start] or len(adj[start]) == 2:
+            continue
+        prev = -1
+        city = start
+        while city != -1:
+            tour.append(city)
+            seen[city] = True
+            nxt = [c for c in adj[city] if c != prev]
+            prev = city
+            city = nxt[0] if nxt else -1
+    tour = np.array(tour)
+    forward = scenario.costsBetween(tour, np.roll(tour, -1)).sum()
+    backward = scenario.costsBetween(np.roll(tour, -1), tour).sum()
+    if backward < forward:
+        tour = tour[::-1]
+    return repair_tour(tour.tolist(), scenario._edge_exists)
+
+
+def cheapest_insertion(tour, cities, scenario):
+    """Insert each of the given city indices into the tour (list of city
+    indices) where it adds the least cost, preferring places where both new
+    edges exist. O(n) per city."""
+    tour = list(tour)
+    for c in cities:
+        if len(tour) < 2:
+            tour.append(c)
+            continue
+        here = np.array(tour)
+        nxt = np.roll(here, -1)
+        added = (scenario.costsBetween(here, np.full(len(here), c)) + scenario.costsBetween(np.full(len(here), c), nxt)
+                 - scenario.costsBetween(here, nxt))
+        # Replacing a missing edge with another missing one gives inf - inf
+        added[np.isnan(added)] = np.inf
+        k = int(np.argmin(added))
+        tour.insert(k + 1, c)
+    return tour
+
+
+def complete_tour(prefix, cost_mat):
+    """Extend a partial tour (list of city indices) to a full one by nearest
+    neighbor over finite edges. Cities left over at a dead end are appended
+    in index order, for repair_tour or local search to fix. O(n^2) worst
+    case, O(n * (n - len(prefix))) in general."""
+    n = len(cost_mat)
+    tour = list(prefix)
+    unvisited = np.ones(n, dtype=bool)
+    unvisited[tour] = False
+    while len(tour) < n:
+        row = np.where(unvisited, cost_mat[tour[-1]], np.inf)
+        nxt = int(np.argmin(row))
+        if row[nxt] == np.inf:
+            tour.extend(np.flatnonzero(unvisited).tolist())
+            break
+        tour.append(nxt)
+        unvisited[nxt] = False
+    return tour
+
+
+def repair_tour(tour, edge_exists, max_tries=None):
+    """Remove missing edges (e.g. deleted by Scenario.thinEdges) from a tour
+    by relocating the city after each missing edge to the nearest place in
+    the tour where all three affected edges exist. Edges that cannot be
+    fixed this way are left in place. Typically O(n) per repair."""
+    n = len(tour)
+    if n < 4:
+        return list(tour)
+    if max_tries is None:
+        max_tries = n
+    tour = list(tour)
+    i = 0
+    moves = 0
+    while i < n and moves <= 4 * n:
+        if edge_exists[tour[i], tour[(i + 1) % n]]:
+            i += 1
+            continue
+        # Move either endpoint of the missing edge
+        slot = _relocate_feasibly(tour, (i + 1) % n, edge_exists, max_tries)
+        if slot is None:
+            slot = _relocate_feasibly(tour, i, edge_exists, max_tries)
+        if slot is None:
+            # Rare fallback: move a short segment next to the missing edge,
+            # then rescan the (rotated) tour from the start
+            moved = None
+            for seg_len in (2, 3):
+                for k in (i + 1, i - seg_len + 1):
+                    moved = moved or _relocate_segment(tour, k % n, seg_len, edge_exists)
+            if moved is None:
+                i += 1
+            else:
+                tour = moved
+                moves += 1
+                i = 0
+            continue
+        moves += 1
+        # Edges before the earlier of the two touched places are unchanged
+        i = max(min(i, slot) - 1, 0)
+    return tour
+
+
+def _relocate_feasibly(tour, k, edge_exists, max_tries):
+    """Move the city at position k (in place) so that the gap it leaves and
+    the place it is inserted are both joined by existing edges, searching
+    outward from k. Returns the position it was inserted at, or None."""
+    n = len(tour)
+    c = tour[k]
+    if not edge_exists[tour[k - 1], tour[(k + 1) % n]]:
+        return None
+    for t in range(min(max_tries, n - 3)):
+        # Slots (tour[j], tour[j+1]) alternately after and before k
+        j = (k + 1 + t // 2) % n if t % 2 == 0 else (k - 2 - t // 2) % n
+        p = tour[j]
+        q = tour[(j + 1) % n]
+        if edge_exists[p, c] and edge_exists[c, q]:
+            tour.pop(k)
+            if j > k:
+                j -= 1
+            tour.insert(j + 1, c)
+            return j + 1
+    return None
+
+
+def _relocate_segment(tour, k, seg_len, edge_exists):
+    """Move the seg_len cities starting at position k, without reversing
+    them, to the nearest place where every affected edge exists. Returns a
+    new tour starting just after the segment's old place, or None."""
+    n = len(tour)
+    seg = [tour[(k + t) % n] for t in range(seg_len)]
+    for a, b in zip(seg, seg[1:]):
+        if not edge_exists[a, b]:
+            return None
+    rest = [tour[(k + seg_len + t) % n] for t in range(n - seg_len)]
+    # rest[0] and rest[-1] are the segment's old neighbors
+    if not edge_exists[rest[-1], rest[0]]:
+        return None
+    m = len(rest)
+    for t in range(m - 1):
+        j = t // 2 if t % 2 == 0 else m - 2 - t // 2
+        if edge_exists[rest[j], seg[0]] and edge_exists[seg[-1], rest[j + 1]]:
+            return rest[:j + 1] + seg + rest[j + 1:]
+    return None
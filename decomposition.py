@@ -0,0 +1,156 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from construction import repair_tour
+from local_search import or_opt, two_opt
+from shared_scenario import SharedScenario, attach
+from spatial import ScenarioCosts, sparse_neighbor_lists
+
+
+def kmeans(xs, ys, k, iters=10, rng=np.random):
+    """Assign each point to one of k spatial clusters with Lloyd's k-means,
+    started from k random points. Empty clusters are dropped, so labels are
+    0..K-1 for some K <= k. O(n k iters)"""
+    n = len(xs)
+    k = max(1, min(k, n))
+    points = np.column_stack((xs, ys))
+    centers = points[rng.choice(n, k, replace=False)]
+    for it in range(iters):
+        dist = ((points[:, np.newaxis, :] - centers[np.newaxis, :, :])**2).sum(axis=2)
+        labels = dist.argmin(axis=1)
+        counts = np.bincount(labels, minlength=k)
+        sums = np.zeros((k, 2))
+        np.add.at(sums, labels, points)
+        used = counts > 0
+        centers[used] = sums[used] / counts[used, np.newaxis]
+    # Renumber the non-empty clusters consecutively
+    used = np.flatnonzero(np.bincount(labels, minlength=k))
+    remap = np.full(k, -1)
+    remap[used] = np.arange(len(used))
+    return remap[labels]
+
+
+def grid_clusters(xs, ys, k):
+    """Assign each point to a cell of a roughly square grid with about k
+    cells over the bounding box. Empty cells are dropped. O(n)"""
+    width = max(xs.max() - xs.min(), 1e-12)
+    height = max(ys.max() - ys.min(), 1e-12)
+    ncols = max(1, int(round(np.sqrt(k * width / height))))
+    nrows = max(1, int(round(k / ncols)))
+    col = np.minimum(((xs - xs.min()) / width * ncols).astype(int), ncols - 1)
+    row = np.minimum(((ys - ys.min()) / height * nrows).astype(int), nrows - 1)
+    # Snake through the rows so consecutive cell numbers are adjacent
+    col = np.where(row % 2 == 1, ncols - 1 - col, col)
+    cell = row * ncols + col
+    used, labels = np.unique(cell, return_inverse=True)
+    return labels
+
+
+def solve_cluster(scenario, members, algorithm, time_allowance):
+    """Process-pool worker: solve the sub-scenario of the given member
+    cities with the named TSPSolver algorithm and return its tour as
+    indices into members. scenario is a Scenario or a SharedScenario
+    handle."""
+    # Imported here so the pool's workers load the solver on first use
+    from TSPSolver import TSPSolver
+    if isinstance(scenario, dict):
+        scenario = attach(scenario)
+    sub_scenario = scenario.subScenario(members)
+    n = len(sub_scenario.getCities())
+    if n < 4:
+        return list(range(n))
+    solver = TSPSolver(None)
+    solver.setupWithScenario(sub_scenario)
+    soln = getattr(solver, algorithm)(time_allowance)['soln']
+    if soln is None:
+        return list(range(n))
+    return [city._index for city in soln.route]
+
+
+def order_clusters(centers):
+    """Visiting order for the clusters: a nearest-neighbor tour over their
+    centers improved with 2-opt. Straight-line distance is used, since
+    elevations and missing edges are handled when the tours are stitched."""
+    k = len(centers)
+    if k < 4:
+        return list(range(k))
+    dist = np.sqrt(((centers[:, np.newaxis, :] - centers[np.newaxis, :, :])**2).sum(axis=2))
+    np.fill_diagonal(dist, np.inf)
+    order = [0]
+    seen = np.zeros(k, dtype=bool)
+    seen[0] = True
+    for i in range(k - 1):
+        row = np.where(seen, np.inf, dist[order[-1]])
+        nxt = int(np.argmin(row))
+        order.append(nxt)
+        seen[nxt] = True
+    near = np.argsort(dist, axis=1)[:, :min(8, k - 1)].tolist()
+    order, moves = two_opt(order, dist, near)
+    return order
+
+
+def stitch(scenario, cluster_tours, order):
+    """Join the cluster tours (each a cycle of city indices) into one tour,
+    visiting clusters in the given order. Each cycle keeps its direction and
+    is opened at the city that makes the join from the previous cluster
+    cheapest, counting the cycle edge that is dropped. O(n)"""
+    tour = list(cluster_tours[order[0]])
+    for c in order[1:]:
+        cycle = np.asarray(cluster_tours[c])
+        if len(cycle) == 1:
+            tour.append(int(cycle[0]))
+            continue
+        prev = np.roll(cycle, 1)
+        # Entering at cycle[k] drops the edge prev[k] -> cycle[k]
+        join = scenario.costsBetween(np.full(len(cycle), tour[-1]), cycle)
+        dropped = scenario.costsBetween(prev, cycle)
+        delta = np.where(np.isfinite(join), join - np.where(np.isfinite(dropped), dropped, 0.0), np.inf)
+        k = int(np.argmin(delta))
+        tour.extend(np.roll(cycle, -k).tolist())
+    return tour
+
+
+def decompose_and_solve(scenario, time_allowance, cluster_size=200, algorithm='or_opt_local_search',
+                        method='kmeans', workers=None, polish=True):
+    """Cluster decomposition: partition the cities spatially, solve every
+    cluster as its own sub-scenario in a process pool, order the clusters,
+    stitch their tours, repair missing edges and polish the whole tour with
+    Or-opt and 2-opt. Returns (tour, number of clusters).
+
+    About half of time_allowance goes to the clusters, shared out over
+    the rounds the pool needs, and the rest to the stitching and polish."""
+    start = time.time()
+    xs, ys, _ = scenario._coords
+    n = len(xs)
+    k = max(1, int(round(n / cluster_size)))
+    labels = kmeans(xs, ys, k) if method == 'kmeans' else grid_clusters(xs, ys, k)
+    k = labels.max() + 1
+    members = [np.flatnonzero(labels == c) for c in range(k)]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    rounds = -(-k // workers)
+    budget = time_allowance / 2 / rounds
+    if k == 1 or workers == 1:
+        local_tours = [solve_cluster(scenario, m, algorithm, budget) for m in members]
+    else:
+        # Workers attach to the scenario in shared memory instead of each
+        # unpickling their own copy
+        with SharedScenario(scenario, share_costs=False) as shared, \
+                ProcessPoolExecutor(max_workers=min(workers, k)) as pool:
+            local_tours = list(pool.map(solve_cluster, [shared.handle] * k, members, [algorithm] * k,
+                                        [budget] * k))
+    cluster_tours = [m[t].tolist() for m, t in zip(members, local_tours)]
+    centers = np.array([[xs[m].mean(), ys[m].mean()] for m in members])
+    tour = stitch(scenario, cluster_tours, order_clusters(centers))
+    tour = repair_tour(tour, scenario._edge_exists)
+    if polish and n >= 8:
+        # No dense matrix: it would not fit for the instances this is for
+        costs = ScenarioCosts(scenario)
+        neighbors = sparse_neighbor_lists(scenario)
+        deadline = start + time_allowance
+        tour, moves = or_opt(tour, costs, *neighbors, deadline=deadline, clock=time.time)
+        tour, moves = two_opt(tour, costs, neighbors[1], deadline=deadline, clock=time.time)
+    return tour, k
@@ -0,0 +1,44 @@
+import numpy as np
+
+
+def double_costs(cost_mat):
+    """Symmetric 2n x 2n cost matrix equivalent to an asymmetric n x n one
+    (node doubling). City i keeps index i and gets a ghost n+i; the ghost
+    edge i -- n+i costs 0, the edge n+i -- j (either way) costs
+    cost_mat[i, j] + K, and every other pair (and every missing edge) is
+    np.inf. A tour that alternates cities with their ghosts,
+    i, n+i, j, n+j, ..., costs the asymmetric tour's cost plus n K.
+
+    K is large enough that no k-opt move (k <= n) that drops a ghost edge
+    can improve a tour, so local searches keep the ghost edges locked.
+    Returns the matrix and K. O(n^2)"""
+    n = len(cost_mat)
+    finite = cost_mat[np.isfinite(cost_mat)]
+    K = n * (finite.max() if len(finite) else 0.0) + 1.0
+    doubled = np.full((2 * n, 2 * n), np.inf)
+    ind = np.arange(n)
+    real = cost_mat + K
+    real[ind, ind] = np.inf
+    doubled[n:, :n] = real
+    doubled[:n, n:] = real.T
+    doubled[ind, n + ind] = 0.0
+    doubled[n + ind, ind] = 0.0
+    return doubled, K
+
+
+def double_tour(tour, n):
+    """The doubled tour i, n+i, j, n+j, ... for a tour of city indices."""
+    tour = np.asarray(tour)
+    return np.column_stack((tour, tour + n)).ravel().tolist()
+
+
+def undouble_tour(doubled_tour, n):
+    """The asymmetric tour a doubled tour stands for: its cities in the
+    direction that has each city followed by its own ghost. Tours whose
+    ghost edges were broken still map to a permutation of the cities;
+    their true cost is just higher. O(n)"""
+    doubled_tour = np.asarray(doubled_tour)
+    at = int(np.flatnonzero(doubled_tour == 0)[0])
+    if doubled_tour[(at + 1) % len(doubled_tour)] != n:
+        doubled_tour = doubled_tour[::-1]
+    return doubled_tour[doubled_tour < n].tolist()
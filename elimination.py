@@ -0,0 +1,86 @@
+import numpy as np
+
+from state import reduce_matrix
+
+
+def reduced_costs(cost_mat):
+    """The branch-and-bound root reduction of a cost matrix: (reduced
+    matrix, lower bound). Every tour costs exactly the bound plus the
+    reduced costs of its edges, since a tour uses each row and each column
+    once. O(n^2)"""
+    reduced = cost_mat.copy()
+    bound = reduce_matrix(reduced)
+    return reduced, bound
+
+
+def _lost_zeros(reduced):
+    """extra[i, k]: how much the minimum of column k rises if row i is
+    deleted from the reduced matrix (nonzero only where row i holds the
+    column's only zero). O(n^2)"""
+    n = len(reduced)
+    if n < 3:
+        return np.zeros_like(reduced)
+    two = np.partition(reduced, 1, axis=0)[:2]
+    first = np.argmin(reduced, axis=0)
+    rise = np.where(np.isfinite(two[1]), two[1] - two[0], 0.0)
+    extra = np.zeros_like(reduced)
+    extra[first, np.arange(n)] = rise
+    return extra
+
+
+def _reduction_bounds(cost_mat):
+    # The root bound, plus each edge's reduced cost, plus what reducing
+    # again would add once the edge covers row i and column j: taken from
+    # the columns (or rows, whichever is larger) whose only zero was in
+    # the removed row (or column)
+    reduced, bound = reduced_costs(cost_mat)
+    col_extra = _lost_zeros(reduced)
+    row_extra = _lost_zeros(reduced.T).T
+    # Deleting row i raises the columns other than j; deleting column j
+    # raises the rows other than i
+    by_cols = col_extra.sum(axis=1)[:, np.newaxis] - col_extra
+    by_rows = row_extra.sum(axis=0)[np.newaxis, :] - row_extra
+    with np.errstate(invalid='ignore'):
+        return bound + reduced + np.maximum(by_cols, by_rows)
+
+
+def edge_bounds(cost_mat):
+    """A lower bound on the cost of any tour using each edge, from the
+    root reduction and from the same reduction done rows first (on the
+    transpose), whichever is larger. O(n^2)"""
+    return np.maximum(_reduction_bounds(cost_mat), _reduction_bounds(cost_mat.T).T)
+
+
+def elimination_mask(cost_mat, incumbent_cost):
+    """Boolean matrix of the edges whose bound (see edge_bounds) is more
+    than incumbent_cost: a tour using one costs more than the incumbent, so
+    no better tour does. The edges of a tour of incumbent_cost are never
+    in it. With symmetric costs an edge goes with its reverse, since the
+    reversed tour costs the same. O(n^2)"""
+    if not np.isfinite(incumbent_cost):
+        return np.zeros(cost_mat.shape, dtype=bool)
+    mask = np.isfinite(cost_mat) & (edge_bounds(cost_mat) > incumbent_cost)
+    if np.array_equal(cost_mat, cost_mat.T):
+        mask |= mask.T
+    return mask
+
+
+def pruned_costs(cost_mat, incumbent_cost):
+    """A copy of cost_mat with the edges elimination_mask rules out set to
+    np.inf, and how many there were. The scenario is left alone, so local
+    searches can use this for their costs and candidate lists. O(n^2)"""
+    mask = elimination_mask(cost_mat, incumbent_cost)
+    pruned = cost_mat.copy()
+    pruned[mask] = np.inf
+    return pruned, int(mask.sum())
+
+
+def eliminate_edges(scenario, incumbent_cost):
+    """Delete from the scenario for good every edge elimination_mask rules
+    out, and return how many were deleted. Every later search on the
+    scenario sees the thinned instance. O(n^2)"""
+    mask = elimination_mask(scenario.getCostMatrix(), incumbent_cost)
+    eliminated = int(mask.sum())
+    if eliminated:
+        scenario.deleteEdges(mask)
+    return eliminated
@@ -0,0 +1,425 @@
+import numpy as np
+
+from tour import TwoLevelTour
+
+
+def neighbor_lists(cost_mat, k=8):
+    """For every city, the k cities with the cheapest finite edge *to* it
+    (near_in) and *from* it (near_out), cheapest first. O(n^2)"""
+    n = len(cost_mat)
+    k = min(k, n - 1)
+    near_out = []
+    near_in = []
+    for mat, out in ((cost_mat, near_out), (cost_mat.T, near_in)):
+        # Partition each row, then sort only the k candidates: O(n^2)
+        cand = np.argpartition(mat, k, axis=1)[:, :k]
+        rows = np.arange(n)[:, np.newaxis]
+        order = np.argsort(mat[rows, cand], axis=1)
+        cand = cand[rows, order]
+        for i in range(n):
+            out.append([int(j) for j in cand[i] if mat[i, j] != np.inf])
+    return near_in, near_out
+
+
+def _rows(cost_mat):
+    """Nested lists for fast c[i][j] lookups. Cost objects that already
+    index that way without a dense matrix (spatial.ScenarioCosts) are used
+    as they are."""
+    return cost_mat.tolist() if isinstance(cost_mat, np.ndarray) else cost_mat
+
+
+class _Focus:
+    """Work queue of cities still to be tried as move starts (don't-look
+    bits): each city is queued at most once at a time, and the cities
+    around every applied move are queued again."""
+
+    def __init__(self, cities):
+        self.queue = list(dict.fromkeys(cities))
+        self.queued = set(self.queue)
+
+    def pop(self):
+        city = self.queue.pop()
+        self.queued.discard(city)
+        return city
+
+    def push(self, *cities):
+        for city in cities:
+            if city not in self.queued:
+                self.queued.add(city)
+                self.queue.append(city)
+
+
+def or_opt(tour, cost_mat, near_in, near_out, max_seg=3, deadline=None,
+           clock=None, focus=None):
+    """Improve a tour (list of city indices) by relocating segments of 1 to
+    max_seg cities elsewhere in the tour without reversing them, so only
+    three edges change and asymmetric costs stay cheap to evaluate.
+    cost_mat is a dense matrix or a spatial.ScenarioCosts.
+
+    Candidate positions are taken from the neighbor lists: a segment is
+    tried after each of its head's near_in cities and before each of its
+    tail's near_out cities. Each move is evaluated in O(1) and applied to a
+    TwoLevelTour in O(sqrt(n)). Returns the improved tour and the number of
+    moves applied.
+
+    If focus is given, only segments starting at those cities are tried at
+    first, then those around each applied move, so the work stays local
+    to e.g. a region of the tour that was just changed."""
+    n = len(tour)
+    if n < max_seg + 3:
+        max_seg = n - 3
+    if max_seg < 1:
+        return list(tour), 0
+    c = _rows(cost_mat)
+    t = TwoLevelTour(tour)
+    moves = 0
+    if focus is not None:
+        work = _Focus(focus)
+        while work.queue:
+            if deadline is not None and clock() > deadline:
+                break
+            s0 = work.pop()
+            sl = s0
+            for seg_len in range(1, max_seg + 1):
+                if seg_len > 1:
+                    sl = t.next(sl)
+                p = _best_insertion(t, c, near_in, near_out, s0, sl)
+                if p is not None:
+                    prev = t.prev(s0)
+                    nxt = t.next(sl)
+                    q = t.next(p)
+                    _relocate(t, s0, sl, p)
+                    moves += 1
+                    work.push(s0, sl, prev, nxt, p, q)
+                    break
+        return t.to_list(tour[0]), moves
+    improved = True
+    while improved:
+        improved = False
+        for seg_len in range(1, max_seg + 1):
+            for s0 in range(n):
+                if deadline is not None and clock() > deadline:
+                    return t.to_list(tour[0]), moves
+                sl = s0
+                for k in range(seg_len - 1):
+                    sl = t.next(sl)
+                p = _best_insertion(t, c, near_in, near_out, s0, sl)
+                if p is not None:
+                    _relocate(t, s0, sl, p)
+                    moves += 1
+                    improved = True
+    return t.to_list(tour[0]), moves
+
+
+def _best_insertion(t, c, near_in, near_out, s0, sl):
+    """Find the best improving city to move the segment s0..sl after, or
+    None. O(k)"""
+    prev = t.prev(s0)
+    nxt = t.next(sl)
+    # Gain from closing the gap the segment leaves behind
+    gain = c[prev][s0] + c[sl][nxt] - c[prev][nxt]
+    best_delta = 0
+    best = None
+    for p in near_in[s0]:
+        if p == prev or t.between(s0, p, sl):
+            continue
+        q = t.next(p)
+        delta = c[p][s0] + c[sl][q] - c[p][q] - gain
+        if delta < best_delta:
+            best_delta = delta
+            best = p
+    for q in near_out[sl]:
+        if q == nxt or t.between(s0, q, sl):
+            continue
+        p = t.prev(q)
+        delta = c[p][s0] + c[sl][q] - c[p][q] - gain
+        if delta < best_delta:
+            best_delta = delta
+            best = p
+    return best
+
+
+def _relocate(t, s0, sl, p):
+    """Move the segment s0..sl to just after city p, keeping its direction,
+    as three reversals: [s0..sl][nxt..p] -> [p..nxt][sl..s0] -> [nxt..p][s0..sl]."""
+    nxt = t.next(sl)
+    t.reverse(s0, p)
+    t.reverse(p, nxt)
+    t.reverse(sl, s0)
+
+
+def two_opt(tour, cost_mat, near_out, max_walk=50, deadline=None, clock=None, focus=None):
+    """Neighbor-list 2-opt: replace tour edges a->b and c->d with a->c and
+    b->d (c taken from a's near_out list), reversing the path b..c.
+
+    With symmetric costs each move is evaluated in O(1). With asymmetric
+    costs the reversed path's edges change cost too, so paths longer than
+    max_walk cities are skipped and shorter ones are walked. Moves are
+    applied to a TwoLevelTour in O(sqrt(n)). cost_mat is a dense matrix or
+    a spatial.ScenarioCosts. Returns the improved tour and the number of
+    moves applied. focus restricts the search as in or_opt."""
+    n = len(tour)
+    if n < 5:
+        return list(tour), 0
+    if isinstance(cost_mat, np.ndarray):
+        symmetric = np.array_equal(cost_mat, cost_mat.T)
+    else:
+        symmetric = cost_mat.symmetric
+    c = _rows(cost_mat)
+    t = TwoLevelTour(tour)
+    moves = 0
+
+    def improve_from(a):
+        """Apply improving moves from a; return the cities they touched."""
+        touched = []
+        b = t.next(a)
+        for cc in near_out[a]:
+            d = t.next(cc)
+            if cc == b or d == a:
+                continue
+            gain = c[a][b] + c[cc][d] - c[a][cc] - c[b][d]
+            if not symmetric:
+                if t.path_length(b, cc) > max_walk:
+                    continue
+                gain += _path_cost(t, c, b, cc, forward=True) - _path_cost(t, c, b, cc, forward=False)
+            if gain > 0:
+                t.reverse(b, cc)
+                touched += [a, b, cc, d]
+                b = t.next(a)
+        return touched
+
+    if focus is not None:
+        work = _Focus(focus)
+        while work.queue:
+            if deadline is not None and clock() > deadline:
+                break
+            touched = improve_from(work.pop())
+            moves += len(touched) // 4
+            work.push(*touched)
+        return t.to_list(tour[0]), moves
+    improved = True
+    while improved:
+        improved = False
+        for a in range(n):
+            if deadline is not None and clock() > deadline:
+                return t.to_list(tour[0]), moves
+            touched = improve_from(a)
+            if touched:
+                moves += len(touched) // 4
+                improved = True
+    return t.to_list(tour[0]), moves
+
+
+# Above this many cities the n x n arrays of two_opt_matrix get too large
+MATRIX_TWO_OPT_MAX = 3000
+
+
+def two_opt_matrix(tour, cost_mat, max_passes=None, deadline=None, clock=None):
+    """Full-neighborhood 2-opt for symmetric costs, one pass at a time. Each
+    pass reorders the cost matrix into tour order D and computes the gain
+    of every move at once:
+
+        delta[i, j] = D[i, j] + D[i+1, j+1] - D[i, i+1] - D[j, j+1]
+
+    for replacing edges i->i+1 and j->j+1 with i->j and i+1->j+1. Of the
+    (at most n) best improving moves, it applies the cheapest first,
+    skipping any that overlap one already taken (disjoint reversals do
+    not change each other's gains). Passes repeat until no move improves.
+    O(n^2) per pass, all in NumPy. Returns the improved tour and the number
+    of moves applied."""
+    tour = np.asarray(tour)
+    n = len(tour)
+    if n < 5:
+        return tour.tolist(), 0
+    # Only j >= i+2 is a move, and i = 0, j = n-1 would remove one edge twice
+    invalid = ~np.triu(np.ones((n, n), dtype=bool), 2)
+    invalid[0, n - 1] = True
+    moves = 0
+    passes = 0
+    while max_passes is None or passes < max_passes:
+        if deadline is not None and clock() > deadline:
+            break
+        passes += 1
+        d = cost_mat[np.ix_(tour, tour)]
+        edge = np.diagonal(np.roll(d, -1, axis=1)).copy()
+        delta = d + np.roll(d, (-1, -1), axis=(0, 1))
+        delta -= edge[:, np.newaxis]
+        delta -= edge[np.newaxis, :]
+        delta[invalid] = 0
+        flat = delta.ravel()
+        best = np.flatnonzero(flat < 0)
+        if len(best) == 0:
+            break
+        if len(best) > n:
+            best = best[np.argpartition(flat[best], n)[:n]]
+        best = best[np.argsort(flat[best], kind='stable')]
+        # Reversals of tour[i+1..j]; they must not share any tour edge
+        used = np.zeros(n, dtype=bool)
+        for i, j in zip(*np.unravel_index(best, (n, n))):
+            if used[i:j + 1].any():
+                continue
+            used[i:j + 1] = True
+            tour[i + 1:j + 1] = tour[i + 1:j + 1][::-1].copy()
+            moves += 1
+    return tour.tolist(), moves
+
+
+def _path_cost(t, c, a, b, forward):
+    """Cost of the path a..b travelled forwards, or backwards from b to a.
+    O(length)"""
+    total = 0
+    x = a
+    while x != b:
+        y = t.next(x)
+        total += c[x][y] if forward else c[y][x]
+        x = y
+    return total
+
+
+def tabu_search(tour, cost_mat, near_in, near_out, tenure=10, max_seg=3, patience=1000, deadline=None,
+                clock=None):
+    """Tabu search over Or-opt and 2-opt moves on a dense cost matrix. Every
+    iteration applies the best admissible move from the neighbor-list
+    candidates, even if it makes the tour worse; all O(n k) candidates are
+    scored at once in NumPy (see _best_tabu_move). Edges a move removes may
+    not be added back for `tenure` iterations; this memory is an n x n
+    matrix of expiries, so checking moves is a lookup. A tabu move is still
+    allowed if it gives a new best tour (aspiration). Stops at the deadline
+    or after `patience` iterations without a new best.
+
+    Returns the best tour, its cost and a dict of counts: iterations,
+    improvements (new best tours) and aspirations."""
+    n = len(tour)
+    stats = {'iterations': 0, 'improvements': 0, 'aspirations': 0}
+    if n < 8:
+        return list(tour), _tour_cost(cost_mat, tour), stats
+    symmetric = np.array_equal(cost_mat, cost_mat.T)
+    near_in = _padded(near_in)
+    near_out = _padded(near_out)
+    start = tour[0]
+    tour = np.array(tour)
+    cost = best_cost = _tour_cost(cost_mat, tour)
+    best_tour = tour.tolist()
+    expiry = np.zeros((n, n), dtype=int)
+    it = 0
+    stale = 0
+    while stale < patience and not (deadline is not None and clock() > deadline):
+        it += 1
+        move = _best_tabu_move(tour, cost_mat, near_in, near_out, expiry, it, best_cost - cost, symmetric,
+                               max_seg)
+        if move is None:
+            break
+        delta, kind, args, removed, aspired = move
+        tour = _apply_tabu_move(tour, kind, *args)
+        for edge in removed:
+            expiry[edge] = it + tenure
+        stats['aspirations'] += aspired
+        cost += delta
+        stale += 1
+        if cost < best_cost:
+            best_cost = cost
+            best_tour = np.roll(tour, -int(np.flatnonzero(tour == start)[0])).tolist()
+            stats['improvements'] += 1
+            stale = 0
+    stats['iterations'] = it
+    return best_tour, best_cost, stats
+
+
+def _tour_cost(cost_mat, tour):
+    return sum(cost_mat[a][b] for a, b in zip(tour, list(tour[1:]) + [tour[0]]))
+
+
+def _padded(lists):
+    """Neighbor lists as an n x k array, short lists padded with -1."""
+    out = np.full((len(lists), max(1, max(len(cands) for cands in lists))), -1, dtype=int)
+    for i, cands in enumerate(lists):
+        out[i, :len(cands)] = cands
+    return out
+
+
+def _best_tabu_move(tour, cost_mat, near_in, near_out, expiry, it, target, symmetric, max_seg):
+    """The best admissible move as (delta, kind, args, removed edges,
+    aspired), or None. A move is admissible if none of the edges it adds is
+    tabu, or if its delta beats target (the gap to the best tour).
+
+    Every candidate is scored at once: rows are the cities the moves start
+    from and columns their neighbor-list entries. With asymmetric costs the
+    path a 2-opt move reverses is priced in O(1) from prefix sums around
+    the tour, kept apart from a count of its missing edges so that one
+    np.inf does not spoil every later sum. O(n k max_seg)"""
+    n = len(tour)
+    c = cost_mat
+    pos = np.empty(n, dtype=int)
+    pos[tour] = np.arange(n)
+    succ = np.roll(tour, -1)[pos]
+    pred = np.roll(tour, 1)[pos]
+    s0 = np.arange(n)[:, np.newaxis]
+    best = None
+    best_delta = np.inf
+
+    def consider(delta, kind, args, added, removed):
+        nonlocal best, best_delta
+        tabu_move = np.zeros(delta.shape, dtype=bool)
+        for src, dst in added:
+            tabu_move |= expiry[src, dst] > it
+        with np.errstate(invalid='ignore'):
+            ok = np.isfinite(delta) & (delta < best_delta) & (~tabu_move | (delta < target))
+        if not ok.any():
+            return
+        at = np.unravel_index(np.argmin(np.where(ok, delta, np.inf)), delta.shape)
+
+        def pick(x):
+            return int(np.broadcast_to(x, delta.shape)[at])
+        best_delta = delta[at]
+        best = (best_delta, kind, tuple(pick(x) for x in args),
+                tuple((pick(src), pick(dst)) for src, dst in removed), bool(tabu_move[at]))
+
+    with np.errstate(invalid='ignore'):
+        for seg_len in range(1, min(max_seg, n - 3) + 1):
+            # Or-opt: move segment s0..sl after p, between p and q
+            sl = tour[(pos + seg_len - 1) % n][:, np.newaxis]
+            prev = pred[:, np.newaxis]
+            nxt = succ[sl]
+            gap = c[prev, nxt] - c[prev, s0] - c[sl, nxt]
+            # p from s0's near_in list, or q from sl's near_out list; the
+            # chosen city must lie outside the segment and its old gap
+            q_out = near_out[sl[:, 0]]
+            for p, q, chosen, gap_end in ((near_in, succ[near_in], near_in, prev),
+                                          (pred[q_out], q_out, q_out, nxt)):
+                valid = (chosen >= 0) & (chosen != gap_end) & ((pos[chosen] - pos[s0]) % n >= seg_len)
+                delta = np.where(valid, gap + c[p, s0] + c[sl, q] - c[p, q], np.inf)
+                consider(delta, 'or', (s0, sl, p), ((prev, nxt), (p, s0), (sl, q)),
+                         ((prev, s0), (sl, nxt), (p, q)))
+
+        # 2-opt: replace a->b and cc->d with a->cc and b->d, reversing b..cc
+        a = s0
+        b = succ[a]
+        cc = near_out
+        d = succ[cc]
+        delta = c[a, cc] + c[b, d] - c[a, b] - c[cc, d]
+        if not symmetric:
+            lo = pos[b]
+            hi = lo + (pos[cc] - lo) % n
+            doubled = np.concatenate([tour, tour, tour[:1]])
+            for sign, edges in ((-1, c[doubled[:-1], doubled[1:]]), (1, c[doubled[1:], doubled[:-1]])):
+                finite = np.isfinite(edges)
+                sums = np.concatenate([[0.0], np.cumsum(np.where(finite, edges, 0.0))])
+                missing = np.concatenate([[0], np.cumsum(~finite)])
+                delta += sign * np.where(missing[hi] > missing[lo], np.inf, sums[hi] - sums[lo])
+        delta = np.where((cc >= 0) & (cc != b) & (d != a), delta, np.inf)
+        consider(delta, '2opt', (b, cc), ((a, cc), (b, d)), ((a, b), (cc, d)))
+    return best
+
+
+def _apply_tabu_move(tour, kind, x, y, p=None):
+    """Apply a move from _best_tabu_move to the tour array and return the
+    new array (rotated so the move does not wrap). O(n)"""
+    tour = np.roll(tour, -int(np.flatnonzero(tour == x)[0]))
+    span = int(np.flatnonzero(tour == y)[0]) + 1
+    if kind == '2opt':
+        # Reverse b..cc
+        tour[:span] = tour[:span][::-1].copy()
+        return tour
+    # Move s0..sl to just after p
+    after = int(np.flatnonzero(tour == p)[0]) + 1
+    return np.concatenate([tour[span:after], tour[:span], tour[after:]])
@@ -0,0 +1,132 @@
+import multiprocessing
+import queue
+import time
+
+import numpy as np
+
+from TSPClasses import TSPSolution
+from shared_scenario import SharedScenario, attach
+
+
+# Raced in separate processes: exact search for small scenarios, local
+# searches for mid-sized ones and a population method in between
+MEMBERS = ['branchAndBound', 'or_opt_local_search', 'two_swap_local_search', 'ant_colony']
+# Run in the parent first: single constructions that take milliseconds
+# even on large scenarios, and give every member that can use one (and
+# the fallback result) a tour to beat
+QUICK_MEMBERS = ['greedy_edge', 'space_filling_curve']
+# Members that accept a starting tour as incumbent=
+SEEDABLE = {'branchAndBound'}
+# Members that never build the dense cost matrix on large scenarios: they
+# work from coordinates and candidate lists (greedy and greedy_random scan
+# its rows only below spatial.GRID_MIN_CITIES cities, where it is cheap)
+MATRIX_FREE = {'defaultRandomTour', 'greedy', 'greedy_random', 'greedy_edge', 'space_filling_curve',
+               'cluster_decomposition'}
+# Extra time given to members to report before they are terminated
+GRACE = 1.0
+
+
+def _context():
+    # Forking is the cheapest way to start the workers where it is available
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return multiprocessing.get_context()
+
+
+def _run_member(handle, name, time_allowance, incumbent, results):
+    """Worker process: run one TSPSolver algorithm on the shared scenario
+    and put (name, tour, results) on the results queue, with the tour as
+    city indices and the TSPSolution left out of the results dict."""
+    from TSPSolver import TSPSolver
+    scenario = attach(handle)
+    solver = TSPSolver(None)
+    solver.setupWithScenario(scenario)
+    kwargs = {}
+    if incumbent is not None and name in SEEDABLE:
+        cities = scenario.getCities()
+        kwargs['incumbent'] = TSPSolution([cities[i] for i in incumbent])
+    try:
+        out = getattr(solver, name)(time_allowance, **kwargs)
+    except Exception as e:
+        results.put((name, None, {'error': repr(e)}))
+        return
+    soln = out.pop('soln', None)
+    tour = [city._index for city in soln.route] if soln is not None else None
+    results.put((name, tour, out))
+
+
+def race(solver, time_allowance, members=None, quick_members=QUICK_MEMBERS):
+    """Race TSPSolver algorithms against one deadline. The quick members run
+    first in this process; the best of their tours is then given to the
+    members that can start from one, and all members run at once in
+    separate processes. Members still running at the deadline (plus GRACE)
+    are terminated. The dense cost matrix is built and shared only if a
+    member outside MATRIX_FREE is racing.
+
+    Members share only that first incumbent: a tour one of them finds
+    during the race is seen by the others only through the final results,
+    never while they run. Returns (best results dict, winning member name,
+    {member: cost, or None if it was terminated}); the results dict and
+    name are None if no member found a tour."""
+    start = time.time()
+    if members is None:
+        members = MEMBERS
+    best = None
+    winner = None
+    costs = {}
+    for name in quick_members:
+        try:
+            out = getattr(solver, name)(time_allowance)
+        except Exception:
+            # A quick member that fails just gives no tour to start from
+            costs[name] = np.inf
+            continue
+        costs[name] = out['cost']
+        if out['soln'] is not None and (best is None or out['cost'] < best['cost']):
+            best = out
+            winner = name
+            solver._improved(out['cost'], member=name)
+    incumbent = None
+    if best is not None and best['cost'] < np.inf:
+        incumbent = [city._index for city in best['soln'].route]
+
+    ctx = _context()
+    results = ctx.Queue()
+    # Members that use the cost matrix read one copy of it from shared
+    # memory instead of each building its own
+    shared = SharedScenario(solver._scenario, share_costs=any(name not in MATRIX_FREE for name in members))
+    procs = []
+    try:
+        remaining = time_allowance - (time.time() - start)
+        procs = [ctx.Process(target=_run_member, args=(shared.handle, name, remaining, incumbent, results),
+                             daemon=True)
+                 for name in members]
+        for p in procs:
+            p.start()
+        cities = solver._scenario.getCities()
+        deadline = start + time_allowance + GRACE
+        pending = len(procs)
+        while pending:
+            try:
+                name, tour, out = results.get(timeout=max(deadline - time.time(), 0.01))
+            except queue.Empty:
+                break
+            pending -= 1
+            costs[name] = out.get('cost', np.inf)
+            if tour is not None and (best is None or out['cost'] < best['cost']):
+                out['soln'] = TSPSolution([cities[i] for i in tour])
+                best = out
+                winner = name
+                solver._improved(out['cost'], member=name)
+    finally:
+        # Members must be gone before their shared blocks are freed
+        for p in procs:
+            if p.is_alive():
+                p.terminate()
+            if p.pid is not None:
+                p.join()
+        shared.close()
+    for name in members:
+        # Terminated members report no cost
+        costs.setdefault(name, None)
+    return best, winner, costs
@@ -0,0 +1,167 @@
+import dis
+import hashlib
+import inspect
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from TSPClasses import TSPSolution
+
+
+def scenario_key(scenario):
+    """Hash of everything that determines a scenario's costs: difficulty,
+    city coordinates and elevations, and which edges exist."""
+    h = hashlib.sha1(scenario._difficulty.encode())
+    for array in scenario._coords:
+        h.update(np.ascontiguousarray(array, dtype=np.float64).tobytes())
+    h.update(bytes(scenario._edge_exists._buf))
+    return h.hexdigest()
+
+
+def solver_fingerprint(method):
+    """Hash of the source of a TSPSolver method, every TSPSolver method it
+    calls (transitively), every project module it uses from TSPSolver's
+    globals and every project module those import in turn. TSPClasses is
+    always included since it defines the costs. Editing one algorithm
+    therefore changes only the fingerprints that depend on it."""
+    func = getattr(method, '__func__', method)
+    cls = type(method.__self__) if hasattr(method, '__self__') else None
+    module_globals = func.__globals__
+    # Only the project's own modules count, not numpy or the stdlib
+    root = os.path.dirname(os.path.abspath(inspect.getsourcefile(func)))
+    sources = set()
+    files = set()
+    seen = set()
+    todo = [func]
+    while todo:
+        f = todo.pop()
+        if f in seen:
+            continue
+        seen.add(f)
+        sources.add(inspect.getsource(f))
+        for name in _names_used(f.__code__):
+            attr = getattr(cls, name, None) if cls is not None else None
+            if inspect.isfunction(attr):
+                todo.append(attr)
+                continue
+            value = module_globals.get(name)
+            if value is None:
+                continue
+            if inspect.isfunction(value) and value.__module__ == func.__module__:
+                todo.append(value)
+                continue
+            module = sys.modules.get(getattr(value, '__module__', None) or getattr(value, '__name__', ''))
+            _add_module_files(module, root, files)
+    _add_module_files(sys.modules.get(TSPSolution.__module__), root, files)
+    h = hashlib.sha1()
+    for source in sorted(sources):
+        h.update(source.encode())
+    for path in sorted(files):
+        with open(path, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def _add_module_files(module, root, files):
+    """Add the file of a project module (one in root) and, recursively, of
+    every project module it imports or takes a name from."""
+    path = getattr(module, '__file__', None)
+    if path is None or os.path.dirname(os.path.abspath(path)) != root:
+        return
+    path = os.path.abspath(path)
+    if path in files:
+        return
+    files.add(path)
+    for value in list(vars(module).values()):
+        if inspect.ismodule(value):
+            _add_module_files(value, root, files)
+        elif isinstance(getattr(value, '__module__', None), str):
+            _add_module_files(sys.modules.get(value.__module__), root, files)
+
+
+def _names_used(code):
+    """Global and attribute names referenced by a code object and any
+    nested code objects (comprehensions, lambdas, inner functions)."""
+    names = set()
+    for instr in dis.get_instructions(code):
+        if instr.opname in ('LOAD_GLOBAL', 'LOAD_ATTR', 'LOAD_METHOD', 'LOAD_NAME'):
+            names.add(instr.argval)
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            names |= _names_used(const)
+    return names
+
+
+class ResultCache:
+    """On-disk cache of solver results keyed by scenario, algorithm, time
+    allowance and solver fingerprint. Each entry is a JSON file holding the
+    results dict, with the tour stored as city indices.
+
+    A cache constructed with directory=None is disabled and simply runs
+    every algorithm, so callers can make caching opt-in."""
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._fingerprints = {}
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def run(self, solver, algorithm, time_allowance=60.0):
+        """Return algorithm(time_allowance) for the solver's scenario, from
+        the cache if this exact run has been done with the current code."""
+        if self.directory is None:
+            return algorithm(time_allowance)
+        path = os.path.join(self.directory, self._key(solver._scenario, algorithm, time_allowance) + '.json')
+        if os.path.exists(path):
+            with open(path) as f:
+                entry = json.load(f)
+            self.hits += 1
+            return self._load(entry, solver._scenario)
+        self.misses += 1
+        results = algorithm(time_allowance)
+        entry = self._dump(results)
+        # Write then rename so an interrupted sweep never leaves half a file
+        tmp = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(entry, f)
+        os.replace(tmp, path)
+        return results
+
+    def _key(self, scenario, algorithm, time_allowance):
+        name = algorithm.__name__
+        if name not in self._fingerprints:
+            self._fingerprints[name] = solver_fingerprint(algorithm)
+        h = hashlib.sha1()
+        for part in (scenario_key(scenario), name, repr(float(time_allowance)), self._fingerprints[name]):
+            h.update(part.encode())
+            h.update(b'\0')
+        return h.hexdigest()
+
+    @staticmethod
+    def _dump(results):
+        entry = {'results': {}, 'tour': None}
+        for key, value in results.items():
+            if key == 'soln':
+                if value is not None:
+                    entry['tour'] = [city._index for city in value.route]
+            elif isinstance(value, (np.generic, np.ndarray)):
+                entry['results'][key] = value.tolist()
+            else:
+                entry['results'][key] = value
+        entry['saved'] = time.time()
+        return entry
+
+    @staticmethod
+    def _load(entry, scenario):
+        results = dict(entry['results'])
+        if entry['tour'] is not None:
+            cities = scenario.getCities()
+            results['soln'] = TSPSolution([cities[i] for i in entry['tour']])
+        else:
+            results['soln'] = None
+        return results
@@ -0,0 +1,101 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from TSPClasses import City, EdgeSet, Scenario
+
+
+class SharedScenario:
+    """Scenario data (coordinates, elevations, packed edge bits and,
+    optionally, the dense cost matrix) copied once into shared memory
+    blocks. Workers get the small picklable `handle` and call attach() to
+    rebuild the Scenario around read-only NumPy views of the blocks, so
+    nothing of size n^2 is pickled or duplicated per process.
+
+    Use as a context manager, or call close() when the workers are done;
+    the blocks are freed then."""
+
+    def __init__(self, scenario, share_costs=None):
+        # Share the cost matrix if it already exists; building it here
+        # would cost the n^2 memory this is meant to save
+        if share_costs is None:
+            share_costs = scenario._cost_matrix is not None
+        self._blocks = []
+        xs, ys, el = scenario._coords
+        arrays = {'xs': xs, 'ys': ys, 'el': el,
+                  'edges': np.frombuffer(scenario._edge_exists._buf, dtype=np.uint8)}
+        if share_costs:
+            arrays['costs'] = scenario.getCostMatrix()
+        self.handle = {
+            'difficulty': scenario._difficulty,
+            'edges_symmetric': scenario._edges_symmetric,
+            'names': [city._name for city in scenario.getCities()],
+            'arrays': {key: self._share(np.ascontiguousarray(array)) for key, array in arrays.items()},
+        }
+
+    def _share(self, array):
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        self._blocks.append(block)
+        return block.name, array.shape, array.dtype.str
+
+    def close(self):
+        """Free the shared blocks. Attached scenarios must not be used
+        afterwards."""
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Scenarios already attached in this process, by their first block's name
+_attached = {}
+
+
+def attach(handle):
+    """Rebuild a Scenario from a SharedScenario handle in a worker process
+    started by this one (e.g. a pool worker). Its arrays are read-only views
+    of the shared blocks; only the City objects (O(n)) are created locally,
+    once per process."""
+    key = handle['arrays']['xs'][0]
+    if key not in _attached:
+        _attached.clear()
+        _attached[key] = _attach(handle)
+    return _attached[key]
+
+
+def _attach(handle):
+    blocks = []
+    views = {}
+    for key, (name, shape, dtype) in handle['arrays'].items():
+        # Worker processes share their parent's resource tracker, so the
+        # block stays registered once and is unlinked only by close()
+        block = shared_memory.SharedMemory(name=name)
+        blocks.append(block)
+        view = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        view.flags.writeable = False
+        views[key] = view
+
+    scenario = Scenario.__new__(Scenario)
+    scenario._difficulty = handle['difficulty']
+    scenario._edges_symmetric = handle['edges_symmetric']
+    scenario._coords = (views['xs'], views['ys'], views['el'])
+    scenario._cities = []
+    for i, (x, y, e, name) in enumerate(zip(views['xs'].tolist(), views['ys'].tolist(), views['el'].tolist(),
+                                            handle['names'])):
+        city = City(x, y, e)
+        city.setScenario(scenario)
+        city.setIndexAndName(i, name)
+        scenario._cities.append(city)
+    scenario.index_of_city = {city: i for i, city in enumerate(scenario._cities)}
+    scenario._edge_exists = EdgeSet.wrap(len(scenario._cities), views['edges'])
+    scenario._cost_matrix = views.get('costs')
+    # The views are only valid while the blocks stay open
+    scenario._shared_blocks = blocks
+    return scenario
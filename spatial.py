@@ -0,0 +1,270 @@
+import numpy as np
+
+from TSPClasses import City
+
+
+def grid_cells(xs, ys, per_cell=2.0):
+    """Bucket points into a uniform grid with about per_cell points per
+    cell. Returns the cell size, the bounding-box origin, the grid shape and
+    each point's (column, row). O(n)"""
+    n = len(xs)
+    x0 = xs.min()
+    y0 = ys.min()
+    width = max(xs.max() - x0, 1e-12)
+    height = max(ys.max() - y0, 1e-12)
+    size = max(np.sqrt(width * height * per_cell / max(n, 1)), 1e-12)
+    ncols = int(width / size) + 1
+    nrows = int(height / size) + 1
+    col = ((xs - x0) / size).astype(int)
+    row = ((ys - y0) / size).astype(int)
+    return size, (x0, y0), (ncols, nrows), col, row
+
+
+def nearest_neighbors(xs, ys, k=8, reach=2):
+    """The (up to) k nearest points to each point by straight-line
+    distance, nearest first, as an (n, k) array padded with -1. Candidates
+    come from the (2*reach+1)^2 surrounding grid cells, so this is O(n)
+    for evenly spread points. Points with fewer than k points in reach get
+    -1 padding."""
+    n = len(xs)
+    size, origin, (ncols, nrows), col, row = grid_cells(xs, ys)
+    cell = col * nrows + row
+    order = np.argsort(cell, kind='stable')
+    counts = np.bincount(cell, minlength=ncols * nrows)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    width = counts.max()
+    # Dense (cell, slot) table of point indices, padded with -1
+    table = np.full((ncols * nrows + 1, width), -1)
+    slot = np.arange(n) - starts[cell[order]]
+    table[cell[order], slot] = order
+    cand = []
+    for dc in range(-reach, reach + 1):
+        for dr in range(-reach, reach + 1):
+            c = col + dc
+            r = row + dr
+            inside = (c >= 0) & (c < ncols) & (r >= 0) & (r < nrows)
+            # Cells outside the grid map to the all -1 row at the end
+            cand.append(table[np.where(inside, c * nrows + r, ncols * nrows)])
+    cand = np.concatenate(cand, axis=1)
+    dist = (xs[cand] - xs[:, np.newaxis])**2 + (ys[cand] - ys[:, np.newaxis])**2
+    dist[(cand < 0) | (cand == np.arange(n)[:, np.newaxis])] = np.inf
+    k = min(k, cand.shape[1])
+    best = np.argsort(dist, axis=1, kind='stable')[:, :k]
+    rows = np.arange(n)[:, np.newaxis]
+    nearest = cand[rows, best]
+    nearest[~np.isfinite(dist[rows, best])] = -1
+    return nearest
+
+
+def sparse_neighbor_lists(scenario, k=8):
+    """Like local_search.neighbor_lists, but without an n x n matrix: the
+    candidates for each city are its 2k nearest cities by straight-line
+    distance, and the k cheapest of them from (near_out) and to (near_in)
+    the city are kept, with missing edges dropped. O(n k)"""
+    xs, ys, _ = scenario._coords
+    n = len(xs)
+    nearest = nearest_neighbors(xs, ys, 2 * k)
+    city = np.repeat(np.arange(n)[:, np.newaxis], nearest.shape[1], axis=1)
+    valid = nearest >= 0
+    lists = []
+    for src, dst in ((nearest, city), (city, nearest)):
+        cost = np.full(nearest.shape, np.inf)
+        cost[valid] = scenario.costsBetween(src[valid], dst[valid])
+        order = np.argsort(cost, axis=1, kind='stable')
+        rows = np.arange(n)[:, np.newaxis]
+        order = order[:, :k]
+        ranked = nearest[rows, order]
+        finite = np.isfinite(cost[rows, order])
+        lists.append([ranked[i][finite[i]].tolist() for i in range(n)])
+    return lists[0], lists[1]
+
+
+class ScenarioCosts:
+    """City.costTo looked up as costs[i][j] without building the n x n cost
+    matrix, for the local searches on scenarios too large for one. Each
+    lookup costs one City.costTo call."""
+
+    def __init__(self, scenario):
+        self.cities = scenario.getCities()
+        self.symmetric = scenario.isSymmetric()
+
+    def __len__(self):
+        return len(self.cities)
+
+    def __getitem__(self, i):
+        return _CostRow(self.cities[i], self.cities)
+
+
+class _CostRow:
+
+    __slots__ = ('src', 'cities')
+
+    def __init__(self, src, cities):
+        self.src = src
+        self.cities = cities
+
+    def __getitem__(self, j):
+        return self.src.costTo(self.cities[j])
+
+
+class GridIndex:
+    """Uniform grid over a scenario's cities supporting deletion and
+    nearest-remaining queries under the scenario's real (asymmetric, possibly
+    missing-edge) cost function.
+
+    Cells are searched in rings of increasing Chebyshev radius around the
+    query city. City.costTo is the straight-line distance plus an elevation
+    difference, so a ring can be skipped once even its closest possible
+    city, at the lowest elevation, would cost no less than the best found."""
+
+    def __init__(self, scenario, per_cell=2.0):
+        self.scenario = scenario
+        xs, ys, el = scenario._coords
+        self.size, origin, (self.ncols, self.nrows), col, row = grid_cells(xs, ys, per_cell)
+        self.col = col.tolist()
+        self.row = row.tolist()
+        self.cells = [[] for c in range(self.ncols * self.nrows)]
+        self.slot = [0] * len(xs)
+        for i, c in enumerate((col * self.nrows + row).tolist()):
+            self.slot[i] = len(self.cells[c])
+            self.cells[c].append(i)
+        self.alive = np.ones(len(xs), dtype=bool)
+        self.remaining = len(xs)
+        if scenario._difficulty == 'Easy':
+            self.elevation = None
+        else:
+            self.elevation = el
+            self.min_elevation = el.min()
+
+    def remove(self, i):
+        """Delete city i from the index. O(1)"""
+        cell = self.cells[self.col[i] * self.nrows + self.row[i]]
+        last = cell.pop()
+        if last != i:
+            cell[self.slot[i]] = last
+            self.slot[last] = self.slot[i]
+        self.alive[i] = False
+        self.remaining -= 1
+
+    def _lower_bound(self, i, dist):
+        """Smallest possible cost from city i to any city at least `dist`
+        away, on the same scale as City.costTo."""
+        if self.elevation is not None:
+            dist += self.min_elevation - self.elevation[i]
+        return np.ceil(max(dist, 0.0) * City.MAP_SCALE)
+
+    def nearest(self, i):
+        """A remaining city with the cheapest finite cost from city i, or None
+        if every remaining city is unreachable. Ties go to whichever city is
+        found first. Roughly O(1) per query for evenly spread cities."""
+        c0 = self.col[i]
+        r0 = self.row[i]
+        best = np.inf
+        best_city = None
+        max_radius = max(self.ncols, self.nrows)
+        if self.elevation is not None:
+            # A city far downhill can cost nothing, so the rings can only
+            # stop once they are further out than the elevation drop allows
+            reach = 1 + (self.elevation[i] - self.min_elevation) / self.size
+            if (2 * reach + 1)**2 > self.remaining:
+                return self._nearest_of(i, np.flatnonzero(self.alive), best, best_city)
+        for radius in range(max_radius + 1):
+            if radius > 0 and self._lower_bound(i, (radius - 1) * self.size) >= best:
+                break
+            ring_cells = 1 if radius == 0 else 8 * radius
+            if ring_cells > self.remaining:
+                # Few cities left: checking them all is cheaper than the ring
+                return self._nearest_of(i, np.flatnonzero(self.alive), best, best_city)
+            cand = []
+            for c, r in self._ring(c0, r0, radius):
+                cand.extend(self.cells[c * self.nrows + r])
+            if cand:
+                best, best_city = self._best_of(i, cand, best, best_city)
+        return best_city
+
+    def _ring(self, c0, r0, radius):
+        """Grid cells at exactly Chebyshev distance `radius`, clipped."""
+        if radius == 0:
+            return [(c0, r0)]
+        cells = []
+        for c in range(max(c0 - radius, 0), min(c0 + radius, self.ncols - 1) + 1):
+            for r in (r0 - radius, r0 + radius):
+                if 0 <= r < self.nrows:
+                    cells.append((c, r))
+        for r in range(max(r0 - radius + 1, 0), min(r0 + radius - 1, self.nrows - 1) + 1):
+            for c in (c0 - radius, c0 + radius):
+                if 0 <= c < self.ncols:
+                    cells.append((c, r))
+        return cells
+
+    # Below this many candidates, calling City.costTo in a loop is cheaper
+    # than the fixed overhead of a vectorized costsBetween call
+    VECTOR_MIN = 32
+
+    def _best_of(self, i, cand, best, best_city):
+        """Fold the cheapest of the candidate cities into (best, best_city)."""
+        if len(cand) < self.VECTOR_MIN:
+            cities = self.scenario._cities
+            src = cities[i]
+            for j in cand:
+                cost = src.costTo(cities[j])
+                if cost < best:
+                    best = cost
+                    best_city = int(j)
+            return best, best_city
+        cand = np.asarray(cand)
+        cost = self.scenario.costsBetween(i, cand)
+        k = np.argmin(cost)
+        if cost[k] < best:
+            return cost[k], int(cand[k])
+        return best, best_city
+
+    def _nearest_of(self, i, cand, best, best_city):
+        if len(cand):
+            best, best_city = self._best_of(i, cand, best, best_city)
+        return best_city
+
+
+class RowScan:
+    """The GridIndex interface answered by scanning the query city's row of
+    the dense cost matrix. For small scenarios this beats the grid, whose
+    construction and ring bookkeeping cost more than the scan they save."""
+
+    def __init__(self, scenario):
+        self.rows = scenario.getCostMatrix().tolist()
+        self.left = list(range(len(self.rows)))
+        self.slot = list(range(len(self.rows)))
+        self.remaining = len(self.rows)
+
+    def remove(self, i):
+        """Delete city i. O(1)"""
+        last = self.left.pop()
+        if last != i:
+            self.left[self.slot[i]] = last
+            self.slot[last] = self.slot[i]
+        self.remaining -= 1
+
+    def nearest(self, i):
+        """A remaining city with the cheapest finite cost from city i, or None
+        if every remaining city is unreachable. O(remaining)"""
+        row = self.rows[i]
+        best = np.inf
+        best_city = None
+        for j in self.left:
+            if row[j] < best:
+                best = row[j]
+                best_city = j
+        return best_city
+
+
+# Below this many cities nearest_index scans rows instead of using a grid
+GRID_MIN_CITIES = 300
+
+
+def nearest_index(scenario):
+    """A RowScan for small scenarios or a GridIndex for large ones, both
+    answering nearest-remaining queries under the scenario's costs."""
+    if len(scenario.getCities()) < GRID_MIN_CITIES:
+        return RowScan(scenario)
+    return GridIndex(scenario)
+
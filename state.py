@@ -1,9 +1,31 @@
 import numpy as np
 
 
+def reduce_matrix(cost_mat):
+    """Subtract each column's minimum from it, then each row's, in place so
+    every row and column with a finite entry has a zero. Returns the total
+    subtracted, a lower bound on any tour's cost. O(n^2)"""
+    # Obtain a vector of min values from each column: O(n^2)
+    col_min = cost_mat.min(axis=0)
+    # Replace infinities with zeros: O(n)
+    col_min[col_min==np.inf] = 0
+    reduction_cost = col_min.sum()
+    # Subtract the min value from each column (in place): O(n^2)
+    np.subtract(cost_mat, col_min, out=cost_mat)
+    # Do the same for the rows: O(n^2)
+    row_min = cost_mat.min(axis=1, keepdims = True)
+    row_min[row_min==np.inf] = 0
+    reduction_cost += row_min.sum()
+    np.subtract(cost_mat, row_min, out=cost_mat)
+    return reduction_cost
+
+
 class State:
 
     nstates = 0
+    # Pool of spare n x n cost matrices, reused by new states so that
+    # expanding a state does not allocate fresh matrices
+    _pool = []
 
     def __init__(self, city=None, parent=None):
         """Creates a new State from a parent State. The new state has a fully 
@@ -17,9 +39,14 @@ class State:
         self.parent = parent
         self.scenario = city._scenario
         # Inherit and update data from the parent state
+        city_ind = self.scenario.index_of_city[city]
         if parent != None:
             self.path = parent.path + [city]
-            self.cost_mat = np.copy(parent.cost_mat)
+            # Actual cost of the partial path and bitmask of visited cities
+            self.cost = parent.cost + parent.city.costTo(city)
+            self.visited = parent.visited | (1 << city_ind)
+            self.cost_mat = State.acquire_matrix(parent.cost_mat.shape)
+            np.copyto(self.cost_mat, parent.cost_mat)
             # Remove inviable routes from the cost matrix: O(n)
             self.block_paths()
             # Reduce the cost matrix: O(n^2)
@@ -27,6 +54,8 @@ class State:
         # No parent, so generate data from scenario
         else:
             self.path = [city]
+            self.cost = 0
+            self.visited = 1 << city_ind
             # Generate a basic cost matrix from the scenario: O(n^2)
             self.cost_mat = self.gen_cost_matrix()
             # Reduce the cost matrix: O(n^2)
@@ -61,18 +90,7 @@ class State:
 
     def reduce_cost_matrix(self):
         """ Reduce the cost matrix. O(n^2)"""
-        # Obtain a vector of min values from each column: O(n^2)
-        col_min = self.cost_mat.min(axis=0)
-        # Replace infinities with zeros: O(n)
-        col_min[col_min==np.inf] = 0
-        reduction_cost = col_min.sum()
-        # Subtract the min value from each column: O(n^2)
-        self.cost_mat = self.cost_mat - col_min
-        # Do the same for the rows: O(n^2)
-        row_min = self.cost_mat.min(axis=1, keepdims = True)
-        row_min[row_min==np.inf] = 0
-        reduction_cost += row_min.sum()
-        self.cost_mat = self.cost_mat - row_min
+        reduction_cost = reduce_matrix(self.cost_mat)
         # Lowerbound is sum of parent cost, reduction cost, and cost from parent to current. 
         if self.parent == None:
             self.lowerbound = reduction_cost
@@ -82,9 +100,86 @@ class State:
             self.lowerbound = (self.parent.get_lowerbound() + 
                         self.parent.cost_mat[parent_ind, city_ind]+ 
                         reduction_cost)
-    def expand(self):
-        """Retrieve all child states of the current state. Worst case O(n^3)."""
-        return [State(city, self) for city in self.remaining_cities]
+    @staticmethod
+    def acquire_matrix(shape):
+        """Take a spare matrix of the given shape from the pool, or allocate
+        one if the pool is empty. Contents are undefined. O(1)"""
+        if State._pool and State._pool[-1].shape == shape:
+            return State._pool.pop()
+        return np.empty(shape)
+
+    @staticmethod
+    def clear_pool():
+        """Drop all pooled matrices (e.g. before solving a new scenario)."""
+        State._pool = []
+
+    def release(self):
+        """Return this state's cost matrix to the pool. The matrix is only
+        needed to build children, so call this once the state has been
+        expanded or pruned. O(1)"""
+        if getattr(self, 'cost_mat', None) is not None:
+            if State._pool and State._pool[-1].shape != self.cost_mat.shape:
+                State._pool = []
+            State._pool.append(self.cost_mat)
+            self.cost_mat = None
+
+    def expand(self, dominance=None):
+        """Retrieve all child states of the current state. Worst case O(n^3).
+        If a DominanceTable is given, children it rejects are never built."""
+        if dominance is None:
+            return [State(city, self) for city in self.remaining_cities]
+        children = []
+        city_ind = self.scenario.index_of_city
+        for city in self.remaining_cities:
+            cost = self.cost + self.city.costTo(city)
+            visited = self.visited | (1 << city_ind[city])
+            if dominance.admit(visited, city_ind[city], cost):
+                children.append(State(city, self))
+        return children
+
+    @staticmethod
+    def from_route(route, cost):
+        """A bare State holding a complete tour found outside the search
+        (e.g. by a heuristic), for use as the BSSF. It has no cost matrix
+        and is not counted in nstates. O(n)"""
+        state = State.__new__(State)
+        state.path = list(route)
+        state.cost = cost
+        state.lowerbound = cost
+        return state
+
+    @staticmethod
+    def from_paths(cities, paths):
+        """Rebuild the states for the given paths (lists of city indices, all
+        starting at the same city) by replaying their expansion from the
+        root. Paths are stored in a trie so shared prefixes are built once,
+        and intermediate states are released as soon as their children
+        exist. Returns the states in the order of paths."""
+        if not paths:
+            return []
+        trie = {}
+        for k, path in enumerate(paths):
+            node = trie
+            for i in path[1:]:
+                node = node.setdefault(i, {})
+            node.setdefault(None, []).append(k)
+        states = [None] * len(paths)
+        root = State(cities[paths[0][0]])
+        todo = [(root, trie)]
+        while todo:
+            state, node = todo.pop()
+            for k in node.get(None, ()):
+                states[k] = state
+            for i, child in node.items():
+                if i is not None:
+                    todo.append((State(cities[i], state), child))
+            if None not in node:
+                state.release()
+        return states
+
+    def get_key(self):
+        """Get the (visited set, current city) key used for dominance."""
+        return self.visited, self.scenario.index_of_city[self.city]
 
     def is_solution(self):
         """Determine whether or not the State is a solution to the TSP 
@@ -109,10 +204,64 @@ class State:
         return self.get_priority() < other.get_priority()
 
 
+def search_key(strategy='hybrid', weight=2.0):
+    """Return a function mapping a State to its heap key, a (primary,
+    secondary) tuple that is computed once when the state is queued.
 
+    best     -- lowest lowerbound first (pure best-first)
+    depth    -- deepest state first, ties broken by lowerbound (depth-first)
+    hybrid   -- lowerbound divided by depth (the original get_priority)
+    weighted -- lowerbound divided by depth**weight, so larger weights
+                dive more aggressively towards complete tours
+    """
+    if strategy == 'best':
+        return lambda s: (s.lowerbound, -len(s.path))
+    if strategy == 'depth':
+        return lambda s: (-len(s.path), s.lowerbound)
+    if strategy == 'hybrid':
+        return lambda s: (s.lowerbound / len(s.path), 0)
+    if strategy == 'weighted':
+        return lambda s: (s.lowerbound / len(s.path) ** weight, 0)
+    raise ValueError('Unknown search strategy: {}'.format(strategy))
 
 
 
+class DominanceTable:
+    """Best known path cost for each (visited set, current city) pair. Two
+    partial paths with the same key have exactly the same completions, so
+    only the cheaper one can lead to a better tour."""
+
+    # Default cap on the number of keys kept, to bound memory use
+    MAX_ENTRIES = 500000
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.best = {}
+        self.max_entries = max_entries
+        self.pruned = 0
+
+    def admit(self, visited, city_ind, cost):
+        """Return False (and count a prune) if a path at least as cheap has
+        already been seen for this key, otherwise record the cost. O(1)"""
+        key = (visited, city_ind)
+        best = self.best.get(key)
+        if best is not None and best <= cost:
+            self.pruned += 1
+            return False
+        # Once full, only keys already in the table are updated
+        if best is not None or len(self.best) < self.max_entries:
+            self.best[key] = cost
+        return True
+
+    def is_dominated(self, state):
+        """Check whether a cheaper path to the same key was recorded after
+        the state was queued. O(1)"""
+        best = self.best.get(state.get_key())
+        if best is not None and best < state.cost:
+            self.pruned += 1
+            return True
+        return False
+
+
 class Scenario():
     def __init__(self, cost_matrix):
         self.cost_mat = cost_matrix
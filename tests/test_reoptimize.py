@@ -0,0 +1,45 @@
+import os
+import random
+import sys
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('PyQt5')
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt5.QtCore import QPointF
+
+from TSPClasses import Scenario
+from TSPSolver import TSPSolver
+
+
+def make_solver(n, difficulty, seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    points = [QPointF(-1.5 + 3.0 * random.random(), -1.0 + 2.0 * random.random()) for i in range(n)]
+    solver = TSPSolver(None)
+    solver.setupWithScenario(Scenario(points, difficulty, seed))
+    return solver
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_reoptimize_after_deleting_tour_edges_one_way(seed):
+    solver = make_solver(200, 'Easy', seed)
+    scenario = solver._scenario
+    previous = solver.greedy_edge()['soln']
+    tour = [city._index for city in previous.route]
+    deleted = [(tour[k], tour[k + 1]) for k in range(0, 200, 25)]
+    for src, dst in deleted:
+        scenario.setEdge(src, dst, False)
+    assert not scenario.isSymmetric()
+
+    results = solver.reoptimize(previous, 5.0)
+
+    route = [city._index for city in results['soln'].route]
+    assert sorted(route) == list(range(200))
+    edges = list(zip(route, route[1:] + route[:1]))
+    assert all(scenario._edge_exists[src, dst] for src, dst in edges)
+    assert not set(deleted) & set(edges)
+    assert np.isfinite(results['cost'])
@@ -0,0 +1,53 @@
+import glob
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip('numpy')
+pytest.importorskip('PyQt5')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FINGERPRINT = '''
+from TSPSolver import TSPSolver
+from result_cache import solver_fingerprint
+solver = TSPSolver(None)
+for name in ('tabu_search', 'greedy_edge', 'two_swap_local_search', 'defaultRandomTour'):
+    print(name, solver_fingerprint(getattr(solver, name)))
+'''
+
+
+def fingerprints(directory):
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+    out = subprocess.run([sys.executable, '-c', FINGERPRINT], cwd=directory, env=env, check=True,
+                         stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return dict(line.split() for line in out.splitlines())
+
+
+def edit(path):
+    with open(path, 'a') as f:
+        f.write('\n# edited\n')
+
+
+def test_editing_an_indirectly_imported_module_changes_the_fingerprint(tmp_path):
+    # Work on a copy, since the fingerprint hashes the files on disk
+    for path in glob.glob(os.path.join(ROOT, '*.py')):
+        shutil.copy(path, str(tmp_path))
+    before = fingerprints(str(tmp_path))
+
+    # local_search imports tour; TSPSolver does not use tour directly
+    edit(str(tmp_path / 'tour.py'))
+    after_tour = fingerprints(str(tmp_path))
+    assert after_tour['tabu_search'] != before['tabu_search']
+    assert after_tour['two_swap_local_search'] != before['two_swap_local_search']
+
+    # construction imports spatial
+    edit(str(tmp_path / 'spatial.py'))
+    after_spatial = fingerprints(str(tmp_path))
+    assert after_spatial['greedy_edge'] != after_tour['greedy_edge']
+
+    # An algorithm that reaches neither module keeps its fingerprint
+    assert after_spatial['defaultRandomTour'] == before['defaultRandomTour']
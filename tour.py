@@ -0,0 +1,208 @@
+import math
+
+
+class _Segment:
+    """A run of consecutive tour cities, stored in a list that is read
+    backwards when `reversed` is set."""
+
+    __slots__ = ('cities', 'reversed', 'rank')
+
+    def __init__(self, cities, reversed, rank):
+        self.cities = cities
+        self.reversed = reversed
+        self.rank = rank
+
+    def first(self):
+        return self.cities[-1] if self.reversed else self.cities[0]
+
+    def last(self):
+        return self.cities[0] if self.reversed else self.cities[-1]
+
+
+class TwoLevelTour:
+    """Tour over city indices 0..n-1 stored as a two-level doubly-linked
+    list: about sqrt(n) segments, each with a reversal bit, in a ring.
+
+    next/prev/between are O(1). Reversing a path splits at most two
+    segments and then reverses the order (and bits) of the whole segments
+    in between, so it costs O(sqrt(n)) instead of the O(n) of list slicing.
+    Reversing the longer side is avoided by reversing the complement and
+    flipping a global orientation bit, which gives the same directed tour.
+    """
+
+    def __init__(self, order):
+        self.n = len(order)
+        self.seg_of = [None] * self.n
+        self.idx_of = [0] * self.n
+        self._build(list(order))
+
+    def _build(self, order):
+        """Cut the tour into segments of about sqrt(n) cities. O(n)"""
+        self.flipped = False
+        self.group = max(8, int(math.sqrt(self.n)))
+        self.segments = []
+        for start in range(0, self.n, self.group):
+            seg = _Segment(order[start:start + self.group], False, len(self.segments))
+            for i, city in enumerate(seg.cities):
+                self.seg_of[city] = seg
+                self.idx_of[city] = i
+            self.segments.append(seg)
+
+    def to_list(self, start=None):
+        """The tour as a list of cities in travel order. O(n)"""
+        order = []
+        for seg in self.segments:
+            order.extend(reversed(seg.cities) if seg.reversed else seg.cities)
+        if self.flipped:
+            order.reverse()
+        if start is not None:
+            i = order.index(start)
+            order = order[i:] + order[:i]
+        return order
+
+    # Internal (unflipped) navigation
+
+    def _next(self, c):
+        seg = self.seg_of[c]
+        i = self.idx_of[c]
+        if seg.reversed:
+            if i > 0:
+                return seg.cities[i - 1]
+        elif i + 1 < len(seg.cities):
+            return seg.cities[i + 1]
+        return self.segments[(seg.rank + 1) % len(self.segments)].first()
+
+    def _prev(self, c):
+        seg = self.seg_of[c]
+        i = self.idx_of[c]
+        if seg.reversed:
+            if i + 1 < len(seg.cities):
+                return seg.cities[i + 1]
+        elif i > 0:
+            return seg.cities[i - 1]
+        return self.segments[seg.rank - 1].last()
+
+    def _pos(self, c):
+        """Order-preserving (not contiguous) position of c. O(1)"""
+        seg = self.seg_of[c]
+        i = self.idx_of[c]
+        if seg.reversed:
+            i = len(seg.cities) - 1 - i
+        return seg.rank * (self.n + 1) + i
+
+    def _between(self, a, b, c):
+        pa = self._pos(a)
+        pb = self._pos(b)
+        pc = self._pos(c)
+        if pa <= pc:
+            return pa <= pb <= pc
+        return pb >= pa or pb <= pc
+
+    # Public queries, in travel order
+
+    def next(self, c):
+        """City visited after c. O(1)"""
+        return self._prev(c) if self.flipped else self._next(c)
+
+    def prev(self, c):
+        """City visited before c. O(1)"""
+        return self._next(c) if self.flipped else self._prev(c)
+
+    def between(self, a, b, c):
+        """True if b lies on the path travelling from a to c (inclusive).
+        O(1)"""
+        if self.flipped:
+            return self._between(c, b, a)
+        return self._between(a, b, c)
+
+    def path_length(self, a, b):
+        """Number of cities on the path travelling from a to b (inclusive).
+        O(sqrt(n))"""
+        if self.flipped:
+            return self._count(b, a)
+        return self._count(a, b)
+
+    def reverse(self, a, b):
+        """Reverse the path travelling from a to b (inclusive), so the tour
+        becomes ... prev(a), b, ..., a, next(b) ... O(sqrt(n))"""
+        if a == b:
+            return
+        if self.flipped:
+            a, b = b, a
+        # Internally this is the path a -> b; reverse whichever of it and
+        # its complement is shorter
+        inner = self._count(a, b)
+        if 2 * inner > self.n:
+            outer_a = self._next(b)
+            outer_b = self._prev(a)
+            self.flipped = not self.flipped
+            if outer_a == a or self._count(outer_a, outer_b) <= 1:
+                return
+            a, b = outer_a, outer_b
+        self._reverse_internal(a, b)
+
+    def _count(self, a, b):
+        """Number of cities on the internal path a -> b, using segment sizes.
+        O(sqrt(n))"""
+        sa = self.seg_of[a]
+        sb = self.seg_of[b]
+        ia = self._local(a)
+        ib = self._local(b)
+        if sa is sb and ia <= ib:
+            return ib - ia + 1
+        count = len(sa.cities) - ia + ib + 1
+        r = (sa.rank + 1) % len(self.segments)
+        while r != sb.rank:
+            count += len(self.segments[r].cities)
+            r = (r + 1) % len(self.segments)
+        return count
+
+    def _local(self, c):
+        seg = self.seg_of[c]
+        i = self.idx_of[c]
+        return len(seg.cities) - 1 - i if seg.reversed else i
+
+    def _reverse_internal(self, a, b):
+        # Make a start a segment and b end one, then reverse whole segments
+        self._split_before(a)
+        self._split_before(self._next(b))
+        first = self.seg_of[a].rank
+        last = self.seg_of[b].rank
+        nseg = len(self.segments)
+        ranks = []
+        r = first
+        while True:
+            ranks.append(r)
+            if r == last:
+                break
+            r = (r + 1) % nseg
+        run = [self.segments[r] for r in ranks]
+        run.reverse()
+        for r, seg in zip(ranks, run):
+            seg.reversed = not seg.reversed
+            seg.rank = r
+            self.segments[r] = seg
+        # Splits accumulate; re-cut the segments once there are too many
+        if nseg > 2 * (self.n // self.group) + 8:
+            self._build(self.to_list())
+
+    def _split_before(self, c):
+        """Split c's segment so that c is the first city of a segment."""
+        seg = self.seg_of[c]
+        if seg.first() == c:
+            return
+        i = self.idx_of[c]
+        if seg.reversed:
+            head, tail = seg.cities[i + 1:], seg.cities[:i + 1]
+        else:
+            head, tail = seg.cities[:i], seg.cities[i:]
+        seg.cities = head
+        new = _Segment(tail, seg.reversed, seg.rank + 1)
+        for j, city in enumerate(head):
+            self.idx_of[city] = j
+        for j, city in enumerate(tail):
+            self.seg_of[city] = new
+            self.idx_of[city] = j
+        self.segments.insert(seg.rank + 1, new)
+        for r in range(seg.rank + 2, len(self.segments)):
+            self.segments[r].rank = r